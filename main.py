@@ -10,10 +10,19 @@ Deploy: https://finance-control-esb.streamlit.app/
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 import requests
+import hashlib
+import io
+import json
+import os
+import shutil
+import threading
+import time
 import datetime
 import calendar
 from datetime import date, timedelta
+from pathlib import Path
 
 # Imports com tratamento de erro para Streamlit Cloud
 PLOTLY_AVAILABLE = False
@@ -26,6 +35,17 @@ except ImportError:
 except Exception:
     pass  # Será tratado mais tarde na interface
 
+# PyArrow (dependência do Streamlit) para o armazenamento colunar em data/
+PYARROW_AVAILABLE = False
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as pa_ds
+    import pyarrow.feather as pa_feather
+    import pyarrow.fs as pa_fs
+    PYARROW_AVAILABLE = True
+except ImportError:
+    pass
+
 # =============================================================================
 # CONSTANTES E CONFIGURAÇÕES GLOBAIS
 # =============================================================================
@@ -38,6 +58,79 @@ MESES_PT = [
 DIAS_SEMANA_ABREV = ["Dom", "Seg", "Ter", "Qua", "Qui", "Sex", "Sáb"]
 DIAS_SEMANA_COMPLETOS = ["Domingo", "Segunda", "Terça", "Quarta", "Quinta", "Sexta", "Sábado"]
 
+# Formatos aceitos para a coluna Data (ordem define a prioridade em empates)
+FORMATOS_DATA = ("%d/%m/%Y", "%Y-%m-%d", "%d-%m-%Y", "%Y/%m/%d", "%d/%m/%y")
+
+# Armazenamento persistente (volume montado pelo docker-compose em /app/data)
+DATA_DIR = Path(os.environ.get("DASHBOARD_DATA_DIR", Path(__file__).parent / "data"))
+COLUNAS_DATASET = ["Data", "Instituição", "Valor", "Registros"]
+
+# API SELIC (BCB): URL configurável, timeout (conexão, leitura) em segundos e novas tentativas
+SELIC_API_URL = os.environ.get(
+    "SELIC_API_URL", "https://www.bcb.gov.br/api/servico/sitebcb/historicotaxasjuros")
+SELIC_TIMEOUT = (3.05, 10)
+SELIC_TENTATIVAS = 3
+SELIC_BACKOFF = 0.5
+SELIC_ESPERA_APOS_FALHA = 300
+
+# Renovação da tabela SELIC em segundo plano (segundos), antes de completar um dia
+SELIC_INTERVALO_ATUALIZACAO = 20 * 3600
+
+# Leitura em blocos para arquivos grandes (linhas por bloco / limite automático)
+TAMANHO_BLOCO_CSV = 200_000
+LIMITE_LEITURA_BLOCOS_MB = 50
+
+# Paginação das tabelas grandes (linhas por página; a segunda opção é o padrão)
+TAMANHOS_PAGINA = (50, 100, 500, 1000)
+
+# Entradas por função nos caches por visão (dataset, dataset salvo relido ou
+# recorte filtrado): as visões menos usadas recentemente são descartadas
+VISOES_CACHE_MAX = 32
+PREFIXO_HASH_FILTRO = "filtro-"
+PREFIXO_HASH_SALVO = "salvo-"
+
+# Uploads lidos mantidos no cache do processo (cada entrada é o DataFrame completo)
+UPLOADS_CACHE_MAX = 4
+
+# Feriados nacionais: fixos (mês, dia) e móveis (dias em relação à Páscoa)
+FERIADOS_FIXOS = {
+    (1, 1): "Confraternização Universal",
+    (4, 21): "Tiradentes",
+    (5, 1): "Dia do Trabalho",
+    (9, 7): "Independência do Brasil",
+    (10, 12): "Nossa Senhora Aparecida",
+    (11, 2): "Finados",
+    (11, 15): "Proclamação da República",
+    (12, 25): "Natal",
+}
+FERIADOS_MOVEIS = {
+    -48: "Carnaval (segunda-feira)",
+    -47: "Carnaval (terça-feira)",
+    -2: "Sexta-feira Santa",
+    60: "Corpus Christi",
+}
+DIAS_UTEIS_ANO = 252
+
+# Opções do valor inicial (0,5x a 1,5x o patrimônio atual) na análise de sensibilidade das metas
+RESOLUCAO_VALOR_INICIO_SENSIBILIDADE = 11
+
+# Simulação Monte Carlo das metas: percentis das faixas e semente (resultado reprodutível)
+PERCENTIS_MONTE_CARLO = (5, 25, 50, 75, 95)
+SEMENTE_MONTE_CARLO = 42
+
+# Elementos (caminhos x meses) por bloco da simulação, limitando a memória de pico
+ELEMENTOS_BLOCO_MONTE_CARLO = 1_000_000
+
+# Colunas do comparativo do patrimônio com a SELIC
+COLUNAS_BENCHMARK_SELIC = [
+    "Fator SELIC Acumulado", "Patrimônio em SELIC", "Excesso sobre SELIC",
+    "Rentabilidade SELIC no Período (%)", "Excesso Relativo no Período (%)"]
+
+# Janelas temporais das médias móveis e evoluções das estatísticas gerais:
+# inteiros são meses do calendário; textos são durações fixas do pandas ("182D")
+JANELAS_PADRAO = (6, 12, 24)
+JANELAS_DIAS = ("182D", "365D", "730D")
+
 # Imports CSS/HTML com tratamento de erro
 try:
     from styles.calendar_css import get_calendar_css
@@ -145,7 +238,7 @@ def create_calendar_day_style(dia, data_atual, hoje, weekend_style=True):
         """
 
 def create_mini_calendar_day_style(dia, data_atual, data_selecionada, datas_disponiveis):
-    """Gera estilos CSS para mini calendários"""
+    """Gera estilos CSS para mini calendários (datas_disponiveis: conjunto de datas)"""
     if data_atual in datas_disponiveis:
         if data_atual.day == data_selecionada:
             # Dia selecionado
@@ -187,28 +280,77 @@ def create_mini_calendar_day_style(dia, data_atual, data_selecionada, datas_disp
         """
 
 
-def render_html_table(df, container=None):
+def render_html_table(df, container=None, column_config=None):
     """Renderiza tabela com st.dataframe"""
     if container:
-        container.dataframe(df, use_container_width=True)
+        container.dataframe(df, use_container_width=True, column_config=column_config)
     else:
-        st.dataframe(df, use_container_width=True)
-
-def format_dataframe_for_display(df, currency_cols=None, percentage_cols=None):
-    """Aplica formatação consistente em DataFrames"""
-    df_display = df.copy()
-    
-    if currency_cols:
-        for col in currency_cols:
-            if col in df_display.columns:
-                df_display[col] = df_display[col].apply(format_currency)
-    
-    if percentage_cols:
-        for col in percentage_cols:
-            if col in df_display.columns:
-                df_display[col] = df_display[col].apply(format_percentage)
-                
-    return df_display
+        st.dataframe(df, use_container_width=True, column_config=column_config)
+
+@st.cache_data(show_spinner=False, max_entries=VISOES_CACHE_MAX)
+def sort_table_positions(chave, _df, coluna, crescente):
+    """Permutação que ordena a tabela pela coluna (cache por chave da tabela, coluna e sentido)
+
+    As posições valem apenas para o frame com a ordem de linhas identificada por ``chave``.
+    """
+    valores = _df.index if coluna == _df.index.name else _df[coluna]
+    ordenado = pd.Series(np.asarray(valores)).sort_values(
+        ascending=crescente, kind="stable", na_position="last")
+    return ordenado.index.to_numpy()
+
+
+def render_paginated_table(df, chave, key, column_config=None):
+    """Tabela paginada no servidor: ordenação e página resolvidas aqui, só a página visível é enviada
+
+    ``chave`` identifica o conteúdo e a ordem das linhas da tabela (ex.: hash
+    do dataset, do dataset salvo relido ou da visão filtrada) para o cache da
+    ordenação; ``key`` prefixa os widgets de navegação.
+    """
+    opcoes_ordem = ["Ordem original"] + ([df.index.name] if df.index.name else []) + list(df.columns)
+    col_ordem, col_sentido, col_tamanho, col_pagina = st.columns([3, 2, 2, 2])
+
+    with col_ordem:
+        coluna = st.selectbox("Ordenar por", opcoes_ordem, key=f"{key}_ordem")
+    with col_sentido:
+        sentido = st.selectbox("Sentido", ["Crescente", "Decrescente"], key=f"{key}_sentido",
+                               disabled=coluna == "Ordem original")
+    with col_tamanho:
+        tamanho = st.selectbox("Linhas por página", TAMANHOS_PAGINA, index=1, key=f"{key}_tamanho")
+
+    total_paginas = max(1, -(-len(df) // tamanho))
+    with col_pagina:
+        # Chave inclui a paginação: mudar o tamanho volta para a primeira página
+        pagina = st.number_input("Página", min_value=1, max_value=total_paginas, value=1, step=1,
+                                 key=f"{key}_pagina_{tamanho}_{total_paginas}")
+
+    inicio = (pagina - 1) * tamanho
+    if coluna == "Ordem original":
+        df_pagina = df.iloc[inicio:inicio + tamanho]
+    else:
+        ordem = sort_table_positions(chave, df, coluna, sentido == "Crescente")
+        df_pagina = df.iloc[ordem[inicio:inicio + tamanho]]
+
+    render_html_table(df_pagina, column_config=column_config)
+    st.caption(f"Linhas {min(inicio + 1, len(df))}–{min(inicio + tamanho, len(df))} de {len(df)} · "
+               f"Página {pagina} de {total_paginas}")
+
+
+def build_column_config(currency_cols=None, percentage_cols=None, decimal_cols=None, date_cols=None):
+    """Formatação declarativa de colunas (os dados permanecem numéricos e datetime64)
+
+    Em ``date_cols``, "_index" formata o índice de datas da tabela.
+    """
+    column_config = {}
+    for col in currency_cols or []:
+        column_config[col] = st.column_config.NumberColumn(col, format="R$ %.2f")
+    for col in percentage_cols or []:
+        column_config[col] = st.column_config.NumberColumn(col, format="%.1f%%")
+    for col in decimal_cols or []:
+        column_config[col] = st.column_config.NumberColumn(col, format="%.3f")
+    for col in date_cols or []:
+        column_config[col] = st.column_config.DateColumn(
+            None if col == "_index" else col, format="DD/MM/YYYY")
+    return column_config
 
 def create_info_metrics(data_dict, columns=4):
     """Cria métricas em colunas com formatação automática"""
@@ -236,19 +378,329 @@ except Exception:
     TEMPLATES_AVAILABLE = False
 
 
-@st.cache_data(ttl="1day")
+# =============================================================================
+# CLIENTE SELIC (API BCB)
+# =============================================================================
+# A tabela SELIC fica em um store compartilhado entre sessões (st.cache_resource)
+# e é renovada por uma thread em segundo plano antes de completar um dia, com
+# trava single-flight: nunca há mais de uma busca em andamento. A sessão HTTP é
+# reutilizada, as requisições têm timeout limitado e novas tentativas com
+# backoff, e o histórico conhecido fica salvo em disco para ser servido de
+# imediato quando a API está lenta ou indisponível. A sincronização é
+# incremental: requisição condicional (ETag/Last-Modified) e conversão apenas
+# dos registros posteriores à última vigência conhecida.
+
+def parse_selic(conteudo):
+    """Converte registros da API de histórico de juros em DataFrame
+
+    A vigência em aberto fica com DataFimVigencia nula; get_selic a completa
+    com a data de hoje.
+    """
+    df = pd.DataFrame(conteudo)
+    df["DataInicioVigencia"] = pd.to_datetime(df["DataInicioVigencia"])
+    df["DataFimVigencia"] = pd.to_datetime(df["DataFimVigencia"])
+    return df.sort_values("DataInicioVigencia").reset_index(drop=True)
+
+
+def merge_selic_history(historico, df_historico, conteudo):
+    """Incorpora ao histórico só os registros posteriores à última vigência conhecida
+
+    Apenas os registros novos são convertidos; a vigência que estava em aberto
+    é encerrada na véspera do início do primeiro registro novo.
+    """
+    ultima_vigencia = max(r["DataInicioVigencia"] for r in historico)
+    novos = sorted(
+        (r for r in conteudo if r["DataInicioVigencia"] > ultima_vigencia),
+        key=lambda r: r["DataInicioVigencia"])
+    if not novos:
+        return historico, df_historico
+
+    fim = pd.Timestamp(novos[0]["DataInicioVigencia"]) - pd.Timedelta(days=1)
+    historico = [
+        dict(r, DataFimVigencia=fim.isoformat()) if r["DataFimVigencia"] is None else r
+        for r in historico
+    ]
+    df_historico = df_historico.copy()
+    df_historico.loc[df_historico["DataFimVigencia"].isna(), "DataFimVigencia"] = fim
+    df_historico = pd.concat([df_historico, parse_selic(novos)], ignore_index=True)
+    return historico + novos, df_historico
+
+
+def request_selic(session, url, validadores=None, tentativas=SELIC_TENTATIVAS, timeout=SELIC_TIMEOUT):
+    """Requisição condicional à API com novas tentativas e backoff exponencial
+
+    Retorna a resposta, ou None quando a API indica que nada mudou (HTTP 304).
+    """
+    cabecalhos = {}
+    if validadores:
+        if validadores.get("etag"):
+            cabecalhos["If-None-Match"] = validadores["etag"]
+        if validadores.get("last_modified"):
+            cabecalhos["If-Modified-Since"] = validadores["last_modified"]
+
+    for tentativa in range(tentativas):
+        try:
+            response = session.get(url, headers=cabecalhos, timeout=timeout)
+            if response.status_code == 304:
+                return None
+            response.raise_for_status()
+            return response
+        except requests.RequestException:
+            if tentativa == tentativas - 1:
+                raise
+            time.sleep(SELIC_BACKOFF * 2 ** tentativa)
+
+
+def save_selic_snapshot(historico, validadores):
+    """Salva o histórico SELIC conhecido em disco"""
+    try:
+        DATA_DIR.mkdir(parents=True, exist_ok=True)
+        with open(DATA_DIR / "selic.json", "w", encoding="utf-8") as f:
+            json.dump({
+                "salvo_em": datetime.datetime.now().isoformat(),
+                "conteudo": historico,
+                "validadores": validadores,
+            }, f)
+    except OSError:
+        pass  # Snapshot é opcional
+
+
+def load_selic_snapshot():
+    """Lê o histórico SELIC salvo em disco, ou None se não houver"""
+    try:
+        with open(DATA_DIR / "selic.json", encoding="utf-8") as f:
+            snapshot = json.load(f)
+        return snapshot if snapshot["conteudo"] else None
+    except (OSError, ValueError, KeyError, IndexError):
+        return None
+
+
+def load_selic_into_store(store, snapshot):
+    """Carrega o histórico salvo no store (conversão completa só na carga inicial)"""
+    store["historico"] = snapshot["conteudo"]
+    store["validadores"] = snapshot.get("validadores") or {}
+    store["df"] = parse_selic(store["historico"])
+
+
+def refresh_selic(store, aguardar=False):
+    """Sincroniza a tabela SELIC com a API (single-flight) e atualiza o store
+
+    Sem ``aguardar``, retorna imediatamente se outra busca estiver em andamento.
+    """
+    if not store["lock"].acquire(blocking=aguardar):
+        return
+    try:
+        if aguardar and store["df"] is not None:
+            return  # Preenchido pela busca que estava em andamento
+        response = request_selic(store["session"], store["url"], store["validadores"])
+        store["atualizado_em"] = time.time()
+        if response is None:
+            return  # Nada mudou desde a última sincronização
+
+        conteudo = response.json()["conteudo"]
+        if store["historico"]:
+            store["historico"], store["df"] = merge_selic_history(
+                store["historico"], store["df"], conteudo)
+        else:
+            store["historico"], store["df"] = conteudo, parse_selic(conteudo)
+        store["validadores"] = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+        save_selic_snapshot(store["historico"], store["validadores"])
+    except (requests.RequestException, ValueError, KeyError):
+        store["falha_ate"] = time.time() + SELIC_ESPERA_APOS_FALHA
+    finally:
+        store["lock"].release()
+
+
+def selic_refresh_loop(store):
+    """Mantém a tabela SELIC aquecida, renovando-a antes de completar um dia
+
+    Encerra quando o store é substituído (ex.: cache limpo pelo menu do Streamlit).
+    """
+    while not store["parar"].is_set():
+        agora = time.time()
+        if agora - store["atualizado_em"] >= SELIC_INTERVALO_ATUALIZACAO and agora >= store["falha_ate"]:
+            refresh_selic(store)
+        store["parar"].wait(60)
+
+
+@st.cache_resource
+def get_selic_store():
+    """Store SELIC compartilhado entre sessões, com atualização em segundo plano"""
+    store = {
+        "df": None,
+        "historico": [],
+        "validadores": {},
+        "atualizado_em": 0.0,
+        "falha_ate": 0.0,
+        "lock": threading.Lock(),
+        "parar": threading.Event(),
+        "session": requests.Session(),
+        "url": SELIC_API_URL,
+    }
+    store["session"].headers.update({"Accept": "application/json"})
+    snapshot = load_selic_snapshot()
+    if snapshot is not None:
+        # Histórico salvo disponível de imediato; a thread sincroniza o restante
+        load_selic_into_store(store, snapshot)
+    # Um único atualizador por processo: o de um store anterior (cache limpo) é encerrado
+    for thread in threading.enumerate():
+        if thread.name == "selic-refresh":
+            thread.parar.set()
+    thread = threading.Thread(target=selic_refresh_loop, args=(store,), name="selic-refresh", daemon=True)
+    thread.parar = store["parar"]
+    thread.start()
+    return store
+
+
 def get_selic():
-    """Obtém dados SELIC do BCB com cache de 1 dia"""
-    url = "https://www.bcb.gov.br/api/servico/sitebcb/historicotaxasjuros"
-    response = requests.get(url)
-    if response.status_code == 200:
-        df = pd.DataFrame(response.json()["conteudo"])
-        df["DataInicioVigencia"] = pd.to_datetime(
-            df["DataInicioVigencia"]).dt.date
-        df["DataFimVigencia"] = pd.to_datetime(df["DataFimVigencia"]).dt.date
-        df["DataFimVigencia"] = df["DataFimVigencia"].fillna(
-            datetime.date.today())
-        return df
+    """Obtém a tabela SELIC mais recente do store, sem aguardar a rede quando possível"""
+    store = get_selic_store()
+    if store["df"] is None and time.time() < store["falha_ate"]:
+        # API fora do ar há pouco: falha de imediato até o fim da espera
+        raise requests.ConnectionError("Dados SELIC indisponíveis")
+    if store["df"] is None:
+        # Primeira busca sem snapshot: aguarda (ou faz) a busca em andamento
+        refresh_selic(store, aguardar=True)
+    if store["df"] is None:
+        raise requests.ConnectionError("Dados SELIC indisponíveis")
+    return store["df"].fillna({"DataFimVigencia": pd.Timestamp.today().normalize()})
+
+
+@st.cache_data(show_spinner=False)
+def build_selic_index(selic_gov):
+    """Índice de intervalos de vigência da SELIC (limites ordenados para busca binária)"""
+    ordenado = selic_gov.sort_values("DataInicioVigencia")
+    return {
+        "inicio": pd.to_datetime(ordenado["DataInicioVigencia"]).to_numpy(dtype="datetime64[D]"),
+        "fim": pd.to_datetime(ordenado["DataFimVigencia"]).to_numpy(dtype="datetime64[D]"),
+        "meta": ordenado["MetaSelic"].to_numpy(dtype=float),
+    }
+
+
+def lookup_selic_rates(indice, datas):
+    """Meta SELIC vigente para cada data (vetorizado; NaN fora das vigências)"""
+    datas = pd.to_datetime(pd.Series(datas)).to_numpy(dtype="datetime64[D]")
+    posicoes = np.searchsorted(indice["inicio"], datas, side="right") - 1
+    validas = posicoes >= 0
+    posicoes = np.where(validas, posicoes, 0)
+    validas &= datas <= indice["fim"][posicoes]
+    return np.where(validas, indice["meta"][posicoes], np.nan)
+
+
+@st.cache_data(show_spinner=False)
+def build_selic_accrual(selic_gov):
+    """Fator acumulado diário da SELIC desde o início do histórico
+
+    As vigências são expandidas em dias corridos de uma só vez (busca binária
+    por dia); cada dia útil rende (1 + meta)^(1/252), os demais rendem zero.
+    Retorna os dias (datetime64[D]) e o fator acumulado até cada dia, inclusive.
+    """
+    indice = build_selic_index(selic_gov)
+    dias = np.arange(indice["inicio"][0], indice["fim"].max() + 1)
+    metas = lookup_selic_rates(indice, dias)
+    anos = dias[[0, -1]].astype("datetime64[Y]").astype(int) + 1970
+    uteis = np.is_busday(dias, holidays=get_holiday_array(int(anos[0]), int(anos[1])))
+    fator_diario = np.where(uteis & ~np.isnan(metas), (1 + metas / 100) ** (1 / DIAS_UTEIS_ANO), 1.)
+    return dias, np.cumprod(fator_diario)
+
+
+# =============================================================================
+# CALENDÁRIO DE DIAS ÚTEIS (FERIADOS NACIONAIS)
+# =============================================================================
+# Feriados fixos e móveis (base Páscoa) calculados uma vez por ano e cacheados;
+# a contagem de dias úteis usa np.busday_count sobre arrays de datas.
+
+def easter_date(ano):
+    """Data da Páscoa no calendário gregoriano (algoritmo de Meeus/Jones/Butcher)"""
+    a = ano % 19
+    b, c = divmod(ano, 100)
+    d, e = divmod(b, 4)
+    f = (b + 8) // 25
+    g = (b - f + 1) // 3
+    h = (19 * a + b - d - g + 15) % 30
+    i, k = divmod(c, 4)
+    l = (32 + 2 * e + 2 * i - h - k) % 7
+    m = (a + 11 * h + 22 * l) // 451
+    mes, dia = divmod(h + l - 7 * m + 114, 31)
+    return datetime.date(ano, mes, dia + 1)
+
+
+@st.cache_data(show_spinner=False)
+def get_brazilian_holidays(ano):
+    """Feriados nacionais do ano (fixos e móveis), como {data: nome}"""
+    feriados = {
+        datetime.date(ano, mes, dia): nome
+        for (mes, dia), nome in FERIADOS_FIXOS.items()
+    }
+    if ano >= 2024:
+        feriados[datetime.date(ano, 11, 20)] = "Consciência Negra"
+
+    pascoa = easter_date(ano)
+    for deslocamento, nome in FERIADOS_MOVEIS.items():
+        feriados[pascoa + timedelta(days=deslocamento)] = nome
+    return dict(sorted(feriados.items()))
+
+
+@st.cache_data(show_spinner=False)
+def get_holiday_array(ano_inicio, ano_fim):
+    """Feriados de um intervalo de anos como array datetime64[D] para np.busday_*"""
+    datas = [data for ano in range(ano_inicio, ano_fim + 1) for data in get_brazilian_holidays(ano)]
+    return np.array(datas, dtype="datetime64[D]")
+
+
+def count_business_days(inicio, fim):
+    """Dias úteis em [inicio, fim) considerando fins de semana e feriados (vetorizado)"""
+    inicio = np.asarray(inicio, dtype="datetime64[D]")
+    fim = np.asarray(fim, dtype="datetime64[D]")
+    anos = np.concatenate([inicio.ravel(), fim.ravel()]).astype("datetime64[Y]").astype(int) + 1970
+    feriados = get_holiday_array(int(anos.min()), int(anos.max()))
+    return np.busday_count(inicio, fim, holidays=feriados)
+
+
+def count_business_days_per_period(periodos):
+    """Dias úteis de cada mês de um PeriodIndex mensal"""
+    return count_business_days(
+        periodos.start_time.to_numpy(dtype="datetime64[D]"),
+        (periodos + 1).start_time.to_numpy(dtype="datetime64[D]"))
+
+
+@st.cache_data(show_spinner=False)
+def build_calendar_html(ano, mes, hoje):
+    """Monta o calendário do mês como um único bloco HTML (cache por mês e dia atual)"""
+    template_dia = get_calendar_day_html()
+    template_semana = get_weekday_html()
+    feriados = get_brazilian_holidays(ano)
+
+    dias_semana_html = "".join(template_semana.format(dia=dia) for dia in DIAS_SEMANA_ABREV)
+
+    dias_html = []
+    # Semanas começando no domingo, como no cabeçalho
+    for semana in calendar.Calendar(firstweekday=6).monthdayscalendar(ano, mes):
+        for i, dia in enumerate(semana):
+            if dia == 0:
+                dias_html.append(template_dia.format(classes="calendar-day empty", dia=""))
+                continue
+            data_atual = datetime.date(ano, mes, dia)
+            classes = "calendar-day"
+            if data_atual == hoje:
+                classes += " today"
+            elif data_atual in feriados:
+                classes += " holiday"
+            elif i == 0 or i == 6:  # Domingo ou Sábado
+                classes += " weekend"
+            dias_html.append(template_dia.format(classes=classes, dia=dia))
+
+    html = get_calendar_css() + get_calendar_html_template().format(
+        mes_nome=MESES_PT[mes - 1],
+        ano=ano,
+        dias_semana_html=dias_semana_html,
+        dias_calendario_html="".join(dias_html)
+    )
+    # Sem indentação/linhas em branco para o markdown não tratar o HTML como código
+    return "\n".join(linha.strip() for linha in html.splitlines() if linha.strip())
 
 
 def create_calendar_widget():
@@ -260,9 +712,15 @@ def create_calendar_widget():
         # Usar função centralizada
         mes_selecionado, ano_selecionado = create_month_year_selector("calendario_widget")
 
+    hoje = datetime.date.today()
+
+    # Calendário em um único bloco HTML a partir dos templates
+    if CSS_AVAILABLE and TEMPLATES_AVAILABLE:
+        st.markdown(build_calendar_html(ano_selecionado, mes_selecionado, hoje), unsafe_allow_html=True)
+        return datetime.date(ano_selecionado, mes_selecionado, 1)
+
     # Criar o calendário
     cal = calendar.monthcalendar(ano_selecionado, mes_selecionado)
-    hoje = datetime.date.today()
 
     # Mostrar informações do calendário
     st.markdown(f"### 📅 {MESES_PT[mes_selecionado-1]} de {ano_selecionado}")
@@ -296,141 +754,386 @@ def create_calendar_widget():
     return datetime.date(ano_selecionado, mes_selecionado, 1)
 
 
-def calc_general_stats(df):
-    """Calcula estatísticas financeiras avançadas e métricas de performance"""
+def window_label(janela):
+    """Rótulo da janela nas colunas das estatísticas (6 → "6M", "182D" → "182D")"""
+    return f"{janela}M" if isinstance(janela, int) else janela
+
+
+def window_start_dates(datas, janela):
+    """Primeiro instante da janela de cada data
+
+    Meses: o mês da data e os ``janela - 1`` meses anteriores, completos.
+    Durações fixas: o intervalo (data - janela, data], como no rolling do pandas.
+    """
+    datas = pd.DatetimeIndex(datas)
+    if isinstance(janela, int):
+        return (datas.to_period("M") - (janela - 1)).start_time
+    return datas - pd.Timedelta(janela) + pd.Timedelta(1, "ns")
+
+
+def window_start_positions(datas, janela):
+    """Posição inicial da janela temporal de cada data
+
+    Busca binária sobre o índice datetime64 ordenado: a janela cobre o mesmo
+    período de calendário independentemente da frequência dos registros.
+    """
+    datas = pd.DatetimeIndex(datas)
+    return datas.searchsorted(window_start_dates(datas, janela), side="left")
+
+
+def rolling_mean(valores, inicio):
+    """Média móvel com início de janela arbitrário, ignorando ausentes (vetorizado)"""
+    valores = np.asarray(valores, dtype=float)
+    posicoes = np.arange(len(valores))
+    validos = ~np.isnan(valores)
+    somas = np.concatenate(([0.], np.cumsum(np.where(validos, valores, 0.))))
+    contagens = np.concatenate(([0], np.cumsum(validos)))
+    soma = somas[posicoes + 1] - somas[inicio]
+    contagem = contagens[posicoes + 1] - contagens[inicio]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(contagem >= 1, soma / contagem, np.nan)
+
+
+def rolling_evolution(valores, inicio, relativa=False):
+    """Evolução entre o primeiro e o último valor de cada janela móvel (vetorizado)
+
+    ``inicio`` é a posição inicial da janela de cada linha (ver
+    window_start_positions). Sem callbacks Python por linha: a contagem de
+    observações válidas por janela vem de soma acumulada, em O(n).
+    """
+    valores = np.asarray(valores, dtype=float)
+    # O rolling do pandas trata infinitos como ausentes
+    valores = np.where(np.isinf(valores), np.nan, valores)
+
+    posicoes = np.arange(len(valores))
+    primeiro = valores[inicio]
+
+    # Observações válidas por janela (equivalente a min_periods=1)
+    validos = np.concatenate(([0], np.cumsum(~np.isnan(valores))))
+    contagem = validos[posicoes + 1] - validos[inicio]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        if relativa:
+            evolucao = np.where(primeiro != 0, valores / primeiro - 1, 0.0)
+        else:
+            evolucao = valores - primeiro
+
+    # Janela com um único elemento não tem evolução
+    evolucao = np.where(posicoes == inicio, 0.0, evolucao)
+    return np.where(contagem >= 1, evolucao, np.nan)
+
+
+def calc_general_stats(df, janelas=JANELAS_PADRAO):
+    """Calcula estatísticas financeiras avançadas e métricas de performance
+
+    As janelas são temporais (meses do calendário ou durações fixas), não
+    quantidades de linhas, então valem para registros diários ou irregulares.
+    """
     # Ordenar e agrupar dados
-    df_sorted = df.sort_values('Data')
-    df_data = df_sorted.groupby(by="Data")["Valor"].sum().to_frame()
-    df_data = df_data.sort_index()  # Ordem cronológica
-
-    df_data["lag_1"] = df_data["Valor"].shift(1)
-    df_data["Diferença Mensal Absoluta"] = df_data["Valor"] - df_data["lag_1"]
-    df_data["Média 6M Diferença Mensal Absoluta"] = df_data["Diferença Mensal Absoluta"].rolling(
-        window=6, min_periods=1).mean()
-    df_data["Média 12M Diferença Mensal Absoluta"] = df_data["Diferença Mensal Absoluta"].rolling(
-        window=12, min_periods=1).mean()
-    df_data["Média 24M Diferença Mensal Absoluta"] = df_data["Diferença Mensal Absoluta"].rolling(
-        window=24, min_periods=1).mean()
-
-    df_data["Diferença Mensal Rel"] = df_data["Valor"] / df_data["lag_1"] - 1
-
-    df_data["Evolução 6M Diferença Mensal"] = df_data["Diferença Mensal Absoluta"].rolling(
-        window=6, min_periods=1).apply(lambda x: x.iloc[-1] - x.iloc[0] if len(x) > 1 else 0)
-    df_data["Evolução 12M Diferença Mensal"] = df_data["Diferença Mensal Absoluta"].rolling(
-        window=12, min_periods=1).apply(lambda x: x.iloc[-1] - x.iloc[0] if len(x) > 1 else 0)
-    df_data["Evolução 24M Diferença Mensal"] = df_data["Diferença Mensal Absoluta"].rolling(
-        window=24, min_periods=1).apply(lambda x: x.iloc[-1] - x.iloc[0] if len(x) > 1 else 0)
-
-    df_data["Evolução 6M Relativa"] = df_data["Diferença Mensal Rel"].rolling(
-        window=6, min_periods=1).apply(lambda x: x.iloc[-1] / x.iloc[0] - 1 if len(x) > 1 and x.iloc[0] != 0 else 0)
-    df_data["Evolução 12M Relativa"] = df_data["Diferença Mensal Rel"].rolling(
-        window=12, min_periods=1).apply(lambda x: x.iloc[-1] / x.iloc[0] - 1 if len(x) > 1 and x.iloc[0] != 0 else 0)
-    df_data["Evolução 24M Relativa"] = df_data["Diferença Mensal Rel"].rolling(
-        window=24, min_periods=1).apply(lambda x: x.iloc[-1] / x.iloc[0] - 1 if len(x) > 1 and x.iloc[0] != 0 else 0)
-
-    df_data = df_data.drop("lag_1", axis=1)
+    df_data = df.groupby(by="Data", sort=True)["Valor"].sum().to_frame()
+    inicios = {janela: window_start_positions(df_data.index, janela) for janela in janelas}
+
+    lag_1 = df_data["Valor"].shift(1)
+    diferenca = df_data["Valor"] - lag_1
+    diferenca_rel = df_data["Valor"] / lag_1 - 1
+
+    df_data["Diferença Mensal Absoluta"] = diferenca
+    for janela in janelas:
+        df_data[f"Média {window_label(janela)} Diferença Mensal Absoluta"] = rolling_mean(
+            diferenca, inicios[janela])
+
+    df_data["Diferença Mensal Rel"] = diferenca_rel
+
+    for janela in janelas:
+        df_data[f"Evolução {window_label(janela)} Diferença Mensal"] = rolling_evolution(
+            diferenca, inicios[janela])
+    for janela in janelas:
+        df_data[f"Evolução {window_label(janela)} Relativa"] = rolling_evolution(
+            diferenca_rel, inicios[janela], relativa=True)
+
     return df_data
 
 
-def main_metas(df_stats):
-    """Interface de configuração e cálculo de metas financeiras"""
+def update_general_stats(df_stats_base, df, datas_alteradas, janelas=JANELAS_PADRAO):
+    """Atualiza estatísticas já calculadas recalculando só as linhas afetadas
+
+    Cada linha depende apenas dos totais dentro da maior janela temporal (mais
+    o registro anterior, para a diferença), então as linhas anteriores à
+    primeira data alterada são reaproveitadas e a cauda é recalculada a partir
+    de um contexto mínimo.
+    """
+    if len(datas_alteradas) == 0:
+        return df_stats_base
+
+    totais = df.groupby(by="Data", sort=True)["Valor"].sum()
+    primeira_alterada = min(datas_alteradas)
+    posicao = totais.index.searchsorted(primeira_alterada)
+    limite = min(window_start_dates([primeira_alterada], janela)[0] for janela in janelas)
+    inicio = max(0, totais.index.searchsorted(limite, side="left") - 1)
+
+    cauda = calc_general_stats(totais.iloc[inicio:].reset_index(), janelas).iloc[posicao - inicio:]
+    reaproveitadas = df_stats_base.loc[df_stats_base.index < primeira_alterada]
+    return pd.concat([reaproveitadas, cauda])
+
+
+def build_monthly_rate_path(periodos, selic_futura, indice_selic=None, capitalizacao_diaria=False):
+    """Taxas mensais efetivas: SELIC histórica nos meses já vigentes e taxa informada nos demais
+
+    Com ``capitalizacao_diaria``, cada mês rende pelos seus dias úteis na base
+    de 252 dias (convenção da SELIC); caso contrário, 1/12 da taxa anual.
+    """
+    selic_anual = np.full(len(periodos), selic_futura, dtype=float)
+    if indice_selic is not None:
+        selic_historica = lookup_selic_rates(indice_selic, periodos.to_timestamp())
+        selic_anual = np.where(np.isnan(selic_historica), selic_anual, selic_historica)
+
+    if capitalizacao_diaria:
+        expoente = count_business_days_per_period(periodos) / DIAS_UTEIS_ANO
+    else:
+        expoente = 1 / 12
+    return (1 + selic_anual / 100) ** expoente - 1
+
+
+def project_goal_trajectory(valor_inicio, aportes, taxas_mensais):
+    """Trajetória mês a mês do patrimônio com juros compostos e aportes (vetorizado)
+
+    P[t] = P[t-1] * (1 + r[t]) + aporte[t], resolvido em uma passada por
+    P[t] = G[t] * (P0 + soma(aporte[k] / G[k])), com G o fator acumulado.
+    Aceita lotes: o último eixo de ``taxas_mensais`` é o tempo e os demais
+    argumentos são combinados por broadcasting.
+    """
+    crescimento = np.cumprod(1 + np.asarray(taxas_mensais, dtype=float), axis=-1)
+    aportes_descontados = np.cumsum(np.asarray(aportes, dtype=float) / crescimento, axis=-1)
+    return crescimento * (np.asarray(valor_inicio, dtype=float)[..., np.newaxis] + aportes_descontados)
+
+
+def evaluate_goal_grid(selic_anual, aportes, valores_inicio, alvo, horizonte):
+    """Resultado da meta para cada combinação SELIC x aporte x valor inicial
+
+    Com taxa constante a trajetória tem forma fechada, então a grade inteira é
+    avaliada em uma única operação com broadcasting (eixos: selic, aporte,
+    valor inicial), sem eixo de tempo. Retorna o patrimônio ao fim do
+    horizonte, os meses até atingir ``alvo`` (NaN se inatingível) e o
+    atingimento do alvo no mês 12 (%).
+    """
+    taxa = ((1 + np.asarray(selic_anual, dtype=float) / 100) ** (1 / 12) - 1)[:, None, None]
+    aporte = np.asarray(aportes, dtype=float)[None, :, None]
+    valor_inicio = np.asarray(valores_inicio, dtype=float)[None, None, :]
+
+    def patrimonio_no_mes(meses):
+        crescimento = (1 + taxa) ** meses
+        with np.errstate(divide="ignore", invalid="ignore"):
+            acumulado_aportes = np.where(taxa > 0, (crescimento - 1) / taxa, meses)
+        return crescimento * valor_inicio + aporte * acumulado_aportes
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # (1+r)^t (P0 + a/r) = alvo + a/r  =>  t = log(razão) / log(1+r)
+        perpetuidade = np.where(taxa > 0, aporte / taxa, np.inf)
+        razao = (alvo + perpetuidade) / (valor_inicio + perpetuidade)
+        meses_com_juros = np.log(razao) / np.log1p(taxa)
+        meses_sem_juros = (alvo - valor_inicio) / aporte
+        meses_ate_alvo = np.ceil(np.where(taxa > 0, meses_com_juros, meses_sem_juros))
+    meses_ate_alvo = np.where(valor_inicio >= alvo, 0, meses_ate_alvo)
+    meses_ate_alvo = np.where(np.isfinite(meses_ate_alvo) & (meses_ate_alvo >= 0), meses_ate_alvo, np.nan)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        atingimento_12m = patrimonio_no_mes(12) / alvo * 100
+    return {
+        "Patrimônio Final": patrimonio_no_mes(horizonte),
+        "Meses até a Meta": meses_ate_alvo,
+        "Atingimento em 12 Meses (%)": atingimento_12m,
+    }
+
+
+@st.cache_data(show_spinner=False, max_entries=VISOES_CACHE_MAX)
+def compute_sensitivity_grid(faixa_selic, faixa_aporte, valor_inicio, resolucao, alvo, horizonte):
+    """Grade de sensibilidade da meta para o valor inicial exibido (cache pelos parâmetros)
+
+    Retorna os eixos e as métricas como grades SELIC x aporte.
+    """
+    eixos = {
+        "selic": np.linspace(*faixa_selic, resolucao),
+        "aporte": np.linspace(*faixa_aporte, resolucao),
+    }
+    resultados = evaluate_goal_grid(eixos["selic"], eixos["aporte"], [valor_inicio], alvo, horizonte)
+    return eixos, {metrica: grade[:, :, 0] for metrica, grade in resultados.items()}
+
+
+@st.cache_data(show_spinner="Simulando cenários...")
+def simulate_goal_paths(valor_inicio, aporte_medio, aporte_desvio, taxas_mensais, choque_selic,
+                        metas_mensais, patrimonio_final, caminhos, semente=SEMENTE_MONTE_CARLO):
+    """Simulação Monte Carlo da meta, vetorizada em caminhos x meses (cache pelos parâmetros)
+
+    A SELIC de cada caminho oscila em passeio aleatório em torno da trajetória
+    base (``choque_selic`` em p.p. ao ano) e os aportes variam com desvio
+    ``aporte_desvio``. Retorna os percentis do patrimônio por mês, a
+    probabilidade de estar acima da meta em cada mês e a de atingir o
+    patrimônio final ao fim do horizonte.
+    """
+    gerador = np.random.default_rng(semente)
+    taxas_mensais = np.asarray(taxas_mensais, dtype=float)
+    metas_mensais = np.asarray(metas_mensais, dtype=float)
+    meses = len(taxas_mensais)
+    fator_base = (1 + taxas_mensais) ** 12
+
+    # Caminhos processados em blocos: os temporários float64 ficam limitados ao
+    # bloco e só as trajetórias (float32) e as contagens de acerto são mantidas
+    trajetorias = np.empty((caminhos, meses), dtype=np.float32)
+    acertos_meta = np.zeros(meses)
+    acertos_final = 0
+    tamanho_bloco = max(1, ELEMENTOS_BLOCO_MONTE_CARLO // meses)
+    for inicio in range(0, caminhos, tamanho_bloco):
+        bloco = min(tamanho_bloco, caminhos - inicio)
+
+        # Choque na taxa anual equivalente, acumulado mês a mês (desvio anual = choque_selic)
+        choques = np.cumsum(gerador.normal(0, choque_selic / 100 / np.sqrt(12), (bloco, meses)), axis=1)
+        fator_anual = np.maximum(fator_base + choques, 1e-6)
+        del choques
+        taxas = (1 + taxas_mensais) * (fator_anual / fator_base) ** (1 / 12) - 1
+        del fator_anual
+
+        aportes = gerador.normal(aporte_medio, aporte_desvio, (bloco, meses))
+        trajetorias_bloco = project_goal_trajectory(valor_inicio, aportes, taxas)
+        del aportes, taxas
+
+        acertos_meta += (trajetorias_bloco >= metas_mensais).sum(axis=0)
+        acertos_final += int((trajetorias_bloco[:, -1] >= patrimonio_final).sum())
+        trajetorias[inicio:inicio + bloco] = trajetorias_bloco
+        del trajetorias_bloco
+
+    # Percentis por faixas de meses, limitando a cópia feita pelo np.percentile
+    meses_por_faixa = max(1, ELEMENTOS_BLOCO_MONTE_CARLO // caminhos)
+    percentis = np.concatenate([
+        np.percentile(trajetorias[:, mes:mes + meses_por_faixa], PERCENTIS_MONTE_CARLO, axis=0)
+        for mes in range(0, meses, meses_por_faixa)], axis=1)
+
+    return {
+        "percentis": percentis,
+        "prob_meta_mensal": acertos_meta / caminhos * 100,
+        "prob_patrimonio_final": acertos_final / caminhos * 100,
+    }
+
+
+@st.cache_data(show_spinner=False, max_entries=VISOES_CACHE_MAX)
+def build_date_index(dataset_hash, _datas):
+    """Índice ano → mês → dias ordenados e conjunto das datas disponíveis"""
+    datas = pd.DatetimeIndex(_datas).sort_values()
+    indice = {}
+    for ano, mes, dia in zip(datas.year.tolist(), datas.month.tolist(), datas.day.tolist()):
+        dias = indice.setdefault(ano, {}).setdefault(mes, [])
+        if not dias or dias[-1] != dia:
+            dias.append(dia)
+    return indice, set(datas.date)
+
+
+@st.cache_data(show_spinner=False, max_entries=VISOES_CACHE_MAX)
+def build_goal_table(dataset_hash, _df_stats, valor_inicio, meta_estimada, patrimonio_final, periodos_inicio,
+                     aporte_mensal, taxas_mensais):
+    """Tabela de acompanhamento das metas (cache pelas premissas confirmadas no formulário)"""
+    horizonte = len(taxas_mensais)
+    periodos = pd.period_range(periodos_inicio, periods=horizonte, freq="M")
+    projecao = project_goal_trajectory(valor_inicio, aporte_mensal, taxas_mensais)
+
+    # Cálculo da tabela de metas (índice mensal por período, sem chaves de texto)
+    passos = np.arange(1, horizonte + 1)
+    meses = pd.DataFrame({
+        "Meta Mensal": valor_inicio + round(meta_estimada/12, 2) * passos,
+        "Patrimônio Projetado": projecao},
+        index=pd.PeriodIndex(periodos, name="Data Referencia"))
+
+    # As-of: último registro até o fim de cada mês de referência (um por mês, sem
+    # duplicar linhas), limitado aos meses que já têm registro
+    registros = pd.DataFrame({
+        "Data Registro": pd.to_datetime(_df_stats.index),
+        "Valor": _df_stats["Valor"].to_numpy()}).sort_values("Data Registro")
+    fim_meses = pd.DataFrame({"Fim Mes": periodos.end_time.normalize()})
+    realizado = pd.merge_asof(
+        fim_meses, registros, left_on="Fim Mes", right_on="Data Registro", direction="backward")
+    sem_registro = periodos > registros["Data Registro"].iloc[-1].to_period("M")
+    realizado.loc[sem_registro, ["Data Registro", "Valor"]] = np.nan
+    meses["Data Registro"] = realizado["Data Registro"].to_numpy()
+    meses["Valor"] = realizado["Valor"].to_numpy()
+
+    meses["Atingimento Esperado"] = meses["Meta Mensal"] / meta_estimada
+
+    meses = meses[["Meta Mensal", "Atingimento Esperado", "Patrimônio Projetado",
+                   "Data Registro", "Valor"]]
+    meses["Atingimento (%)"] = (
+        meses["Valor"] / meses["Meta Mensal"] * 100).round(1)
+
+    meses["Atingimento Ano"] = (
+        meses["Valor"] / patrimonio_final * 100).round(1)
+
+    return meses
+
+
+def confirm_goal_start_date(chave_dia, ano, mes):
+    """Callback do envio do formulário de metas: fixa a data de início escolhida"""
+    st.session_state["data_meta_confirmada"] = pd.Timestamp(ano, mes, st.session_state[chave_dia])
+
+
+def main_metas(df_stats, dataset_hash):
+    """Interface de configuração e cálculo de metas financeiras
+
+    Todas as premissas ficam em um único st.form: digitar não reexecuta nada e
+    a projeção é recalculada apenas ao confirmar o formulário. Ano e mês ficam
+    fora do formulário e apenas navegam pelos dias oferecidos.
+    """
     # Seção de configuração de metas
     st.markdown("### 🎯 Configuração de Metas Financeiras")
 
-    # Container para os campos de entrada
-    with st.container(border=True):
-        st.markdown("#### 💰 Metas")
-        col1, col2 = st.columns(2)
-
-        with col1:
-            custos_fixos = st.number_input(
-                "Custos Fixos (R$)", min_value=0., format="%.2f", key="custos_fixos")
+    # Índice ano → mês → dias e conjunto de datas (cache por dataset)
+    indice_datas, conjunto_datas = build_date_index(dataset_hash, df_stats.index)
 
-        with col2:
-            salario_bruto = st.number_input(
-                "Salário Bruto (R$)", min_value=0., format="%.2f", key="salario_bruto")
+    # Padrão: último dia disponível do primeiro mês com dados
+    primeiro_ano = next(iter(indice_datas))
+    primeiro_mes = next(iter(indice_datas[primeiro_ano]))
+    data_padrao = pd.Timestamp(primeiro_ano, primeiro_mes, indice_datas[primeiro_ano][primeiro_mes][-1])
 
-        salario_liquido = st.number_input(
-            "Salário Líquido (R$)", min_value=0., format="%.2f", key="salario_liquido")
+    # Data confirmada no último envio do formulário
+    data_inicio_meta = st.session_state.get("data_meta_confirmada", data_padrao)
+    if data_inicio_meta not in df_stats.index:
+        data_inicio_meta = data_padrao
+    valor_inicio = df_stats.loc[data_inicio_meta, "Valor"]
 
-    # Container para dados de início da meta
+    # Navegação ano/mês fora do formulário (só filtra os dias oferecidos)
     with st.container(border=True):
         st.markdown("#### 📅 Dados de Início da Meta")
-
-        # Extrair datas disponíveis do DataFrame
-        datas_disponiveis = sorted(df_stats.index)
-        
-        # Usar função centralizada para seletores de mês/ano
-        anos_unicos = sorted(list(set([d.year for d in datas_disponiveis])))
-        col_ano_meta, col_mes_meta, col_dia_meta = st.columns(3)
+        anos_unicos = list(indice_datas)
+        col_ano_meta, col_mes_meta = st.columns(2)
 
         with col_ano_meta:
-            ano_meta_selecionado = st.selectbox(
+            ano_navegado = st.selectbox(
                 "Ano da Meta",
                 options=anos_unicos,
-                index=0,
+                index=anos_unicos.index(data_inicio_meta.year),
                 key="ano_meta_inicio"
             )
 
-        # Filtrar meses disponíveis para o ano selecionado
-        meses_disponiveis_ano = sorted(list(
-            set([d.month for d in datas_disponiveis if d.year == ano_meta_selecionado])))
+        # Meses disponíveis para o ano selecionado
+        meses_disponiveis_ano = list(indice_datas[ano_navegado])
+        mes_padrao = data_inicio_meta.month if ano_navegado == data_inicio_meta.year else meses_disponiveis_ano[0]
 
         with col_mes_meta:
-            mes_meta_selecionado = st.selectbox(
+            mes_navegado = st.selectbox(
                 "Mês da Meta",
                 options=meses_disponiveis_ano,
                 format_func=lambda x: MESES_PT[x-1],  # Usar constante centralizada
-                index=0,
-                key="mes_meta_inicio"
+                index=meses_disponiveis_ano.index(mes_padrao),
+                key=f"mes_meta_inicio_{ano_navegado}"
             )
 
-        # Filtrar dias disponíveis para o ano/mês selecionado
-        dias_disponiveis_mes = sorted(list(
-            set([d.day for d in datas_disponiveis if d.year == ano_meta_selecionado and d.month == mes_meta_selecionado])))
-
-        with col_dia_meta:
-            if dias_disponiveis_mes:
-                dia_meta_selecionado = st.selectbox(
-                    "Dia da Meta",
-                    options=dias_disponiveis_mes,
-                    index=len(dias_disponiveis_mes) - 1,  # Último dia disponível
-                    key=f"dia_meta_inicio_{ano_meta_selecionado}_{mes_meta_selecionado}"
-                )
-            else:
-                st.warning("Nenhum dia disponível")
-                dia_meta_selecionado = 1
-
-        # Construir a data selecionada
-        try:
-            data_inicio_meta = datetime.date(
-                ano_meta_selecionado, mes_meta_selecionado, dia_meta_selecionado)
-
-            # Verificar se a data existe nos dados
-            if data_inicio_meta in datas_disponiveis:
-                valor_inicio = df_stats.loc[data_inicio_meta, "Valor"]
-            else:
-                # Encontrar a data mais próxima
-                datas_do_mes = [d for d in datas_disponiveis if d.year ==
-                                ano_meta_selecionado and d.month == mes_meta_selecionado]
-                if datas_do_mes:
-                    data_inicio_meta = max(datas_do_mes)  # Última data do mês
-                    valor_inicio = df_stats.loc[data_inicio_meta, "Valor"]
-                else:
-                    # Fallback para primeira data disponível
-                    data_inicio_meta = datas_disponiveis[0]
-                    valor_inicio = df_stats.loc[data_inicio_meta, "Valor"]
-        except ValueError:
-            # Data inválida, usar primeira data disponível
-            data_inicio_meta = datas_disponiveis[0]
-            valor_inicio = df_stats.loc[data_inicio_meta, "Valor"]
+        dias_disponiveis_mes = indice_datas[ano_navegado][mes_navegado]
+        chave_dia = f"dia_meta_inicio_{ano_navegado}_{mes_navegado}"
+        mes_confirmado = (ano_navegado, mes_navegado) == (data_inicio_meta.year, data_inicio_meta.month)
+        dia_destacado = data_inicio_meta.day if mes_confirmado else 0
 
         # Exibir mini calendário visual para referência
         st.markdown("**📅 Calendário de Referência:**")
 
         # Criar um calendário visual simples para o mês selecionado
         cal = calendar.monthcalendar(
-            ano_meta_selecionado, mes_meta_selecionado)
+            ano_navegado, mes_navegado)
 
         # Cabeçalho dos dias
         col_cal = st.columns(7)
@@ -452,39 +1155,119 @@ def main_metas(df_stats):
                         st.markdown("")
                     else:
                         # Usar função centralizada para estilo do mini calendário
-                        data_check = datetime.date(ano_meta_selecionado, mes_meta_selecionado, dia)
+                        data_check = datetime.date(ano_navegado, mes_navegado, dia)
                         html_day = create_mini_calendar_day_style(
-                            dia, data_check, dia_meta_selecionado, datas_disponiveis
+                            dia, data_check, dia_destacado, conjunto_datas
                         )
                         st.markdown(html_day, unsafe_allow_html=True)
 
         st.markdown(
-            f"**Patrimônio no Início da Meta:** {format_currency(valor_inicio)}")  # Usar função centralizada
+            f"**Patrimônio no Início da Meta:** {format_currency(valor_inicio)} "
+            f"({data_inicio_meta:%d/%m/%Y})")  # Usar função centralizada
 
-    # Container para configuração da SELIC
-    with st.container(border=True):
-        # Tratamento de erro para API da SELIC
-        try:
-            selic_gov = get_selic()
-            filter_selic_date = (selic_gov["DataInicioVigencia"] <= data_inicio_meta) & (
-                selic_gov["DataFimVigencia"] >= data_inicio_meta)
-            selic_filtered = selic_gov.loc[filter_selic_date]
+    # Tratamento de erro para API da SELIC
+    indice_selic = None
+    try:
+        indice_selic = build_selic_index(get_selic())
+        selic_vigente = lookup_selic_rates(indice_selic, [data_inicio_meta])[0]
 
-            if not selic_filtered.empty:
-                selic_default = selic_filtered["MetaSelic"].iloc[0]
-            else:
-                selic_default = 10.75  # Valor padrão se não encontrar
-        except:
-            selic_default = 10.75  # Valor padrão em caso de erro
+        if not np.isnan(selic_vigente):
+            selic_default = float(selic_vigente)
+        else:
+            selic_default = 10.75  # Valor padrão se não encontrar
+    except:
+        selic_default = 10.75  # Valor padrão em caso de erro
+
+    # Padrões dependentes da data e da meta confirmadas: só substituem o valor
+    # do campo enquanto o usuário não o alterou (valor igual ao padrão anterior)
+    meta_confirmada = st.session_state.get("meta_estimada", 0.)
+    padroes = {
+        "selic_meta": selic_default,
+        "patrimonio_final": float(meta_confirmada + valor_inicio if meta_confirmada > 0 else valor_inicio),
+    }
+    padroes_anteriores = st.session_state.get("metas_padroes", {})
+    for chave, padrao in padroes.items():
+        if chave not in st.session_state or st.session_state[chave] == padroes_anteriores.get(chave):
+            st.session_state[chave] = padrao
+    st.session_state["metas_padroes"] = padroes
+
+    with st.form("form_metas", border=False):
+        # Container para os campos de entrada
+        with st.container(border=True):
+            st.markdown("#### 💰 Metas")
+            col1, col2 = st.columns(2)
+
+            with col1:
+                custos_fixos = st.number_input(
+                    "Custos Fixos (R$)", min_value=0., format="%.2f", key="custos_fixos")
+
+            with col2:
+                salario_bruto = st.number_input(
+                    "Salário Bruto (R$)", min_value=0., format="%.2f", key="salario_bruto")
+
+            salario_liquido = st.number_input(
+                "Salário Líquido (R$)", min_value=0., format="%.2f", key="salario_liquido")
 
-        selic = st.number_input("Selic (%)", min_value=0.,
-                                value=selic_default, format="%.2f")
-        selic_ano = selic / 100
-        selic_mes = (selic_ano + 1) ** (1/12) - 1
+        # Dia da meta dentro do mês navegado (aplicado ao confirmar o formulário)
+        with st.container(border=True):
+            st.markdown(f"#### 📅 Dia de Início da Meta ({MESES_PT[mes_navegado-1]} de {ano_navegado})")
+            st.selectbox(
+                "Dia da Meta",
+                options=dias_disponiveis_mes,
+                index=len(dias_disponiveis_mes) - 1,  # Último dia disponível
+                key=chave_dia
+            )
+
+        # Container para configuração da SELIC
+        with st.container(border=True):
+            selic = st.number_input("Selic (%)", min_value=0., format="%.2f", key="selic_meta")
+
+        # Container para configuração de metas
+        with st.container(border=True):
+            st.markdown("#### 🎯 Configuração de Metas")
+            col1_meta, col2_meta = st.columns(2)
+
+            with col1_meta:
+                meta_estimada = st.number_input(
+                    "Meta Estimada (R$)", min_value=0., format="%.2f", key="meta_estimada")
+
+            with col2_meta:
+                patrimonio_final = st.number_input(
+                    "Patrimônio Estimado pós Meta (R$)",
+                    min_value=0.,
+                    format="%.2f",
+                    help="Patrimônio total esperado após atingir a meta",
+                    key="patrimonio_final"
+                )
+
+            col1_proj, col2_proj = st.columns(2)
+
+            with col1_proj:
+                horizonte_anos = st.slider(
+                    "Horizonte da Projeção (anos)", min_value=1, max_value=40, value=1, key="horizonte_meta")
+
+            with col2_proj:
+                usar_selic_historica = st.checkbox(
+                    "Usar SELIC histórica nos meses já vigentes",
+                    value=True,
+                    help="Meses futuros usam a Selic informada acima",
+                    key="usar_selic_historica"
+                )
+                capitalizacao_diaria = st.checkbox(
+                    "Capitalização diária (252 dias úteis)",
+                    value=False,
+                    help="Rendimento de cada mês pelos seus dias úteis, descontando feriados nacionais",
+                    key="capitalizacao_diaria"
+                )
+
+        st.form_submit_button(
+            "✅ Calcular Metas", type="primary", use_container_width=True,
+            on_click=confirm_goal_start_date, args=(chave_dia, ano_navegado, mes_navegado))
 
     # Cálculos de rendimento
+    selic_ano = selic / 100
+    selic_mes = (selic_ano + 1) ** (1/12) - 1
     rendimento_ano = valor_inicio * selic_ano
-    rendimento_mes = valor_inicio * selic_mes
     mensal = salario_liquido - custos_fixos + valor_inicio * selic_mes
     anual = 12 * (salario_liquido - custos_fixos) + rendimento_ano
 
@@ -502,78 +1285,734 @@ def main_metas(df_stats):
             st.markdown("**Potencial Arrecadação Anual**")
             st.markdown(format_currency(anual))  # Usar função centralizada
 
-    # Container para configuração de metas
+    # Projeção mês a mês com taxa variável (histórica + informada)
+    periodos = pd.period_range(pd.Period(data_inicio_meta, "M") + 1, periods=12 * horizonte_anos, freq="M")
+    taxas_mensais = build_monthly_rate_path(
+        periodos, selic, indice_selic if usar_selic_historica else None, capitalizacao_diaria)
+    meses = build_goal_table(
+        dataset_hash, df_stats, valor_inicio, meta_estimada, patrimonio_final, periodos[0],
+        salario_liquido - custos_fixos, taxas_mensais)
+
+    # Container para a tabela de resultados
+    st.markdown("#### 📊 Acompanhamento de Metas")
     with st.container(border=True):
-        st.markdown("#### 🎯 Configuração de Metas")
-        col1_meta, col2_meta = st.columns(2)
-
-        with col1_meta:
-            meta_estimada = st.number_input(
-                "Meta Estimada (R$)", min_value=0., format="%.2f", key="meta_estimada")
-
-        with col2_meta:
-            patrimonio_final = st.number_input(
-                "Patrimônio Estimado pós Meta (R$)",
-                min_value=0.,
-                value=meta_estimada + valor_inicio if meta_estimada > 0 else valor_inicio,
-                format="%.2f",
-                help="Patrimônio total esperado após atingir a meta",
-                key="patrimonio_final"
-            )
+        # Formatação declarativa usando função centralizada
+        meses_config = build_column_config(
+            currency_cols=["Meta Mensal", "Patrimônio Projetado", "Valor"],
+            percentage_cols=["Atingimento (%)", "Atingimento Ano"],
+            decimal_cols=["Atingimento Esperado"],
+            date_cols=["Data Registro"]
+        )
+        render_html_table(meses, column_config=meses_config)
+
+    # Retornar os valores solicitados incluindo o DataFrame meses e as premissas da projeção
+    return (data_inicio_meta, valor_inicio, meta_estimada, patrimonio_final, meses,
+            salario_liquido - custos_fixos, taxas_mensais)
+
+
+def render_monte_carlo_analysis(df_stats, valor_inicio, meta_estimada, patrimonio_final, meses,
+                                aporte_mensal, taxas_mensais):
+    """Projeção estocástica da meta: faixas de percentis e probabilidade de atingimento"""
+    st.markdown("### 🎲 Simulação Monte Carlo")
+    if meta_estimada <= 0:
+        st.info("Informe a meta estimada na aba 'Configuração' para simular cenários.")
+        return
+
+    # Variabilidade dos aportes estimada pelo histórico de diferenças mensais
+    diferencas = df_stats["Diferença Mensal Absoluta"].dropna()
+    desvio_historico = float(diferencas.std()) if len(diferencas) > 1 else 0.
+
+    col_caminhos, col_choque, col_desvio = st.columns(3)
+    with col_caminhos:
+        caminhos = st.select_slider(
+            "Cenários simulados", options=[1000, 5000, 10000, 20000, 50000], value=10000, key="mc_caminhos")
+    with col_choque:
+        choque_selic = st.slider(
+            "Volatilidade da Selic (p.p. ao ano)", 0.0, 5.0, 1.0, step=0.25, key="mc_choque_selic")
+    with col_desvio:
+        aporte_desvio = st.number_input(
+            "Desvio dos aportes mensais (R$)",
+            min_value=0.,
+            value=round(desvio_historico, 2),
+            format="%.2f",
+            help="Padrão: desvio histórico da Diferença Mensal Absoluta",
+            key="mc_desvio_aporte"
+        )
 
-    # Cálculo da tabela de metas
-    meses = pd.DataFrame({
-        "Data Referencia": [
-            data_inicio_meta + pd.DateOffset(months=i) for i in range(1, 13)],
-        "Meta Mensal": [valor_inicio + round(meta_estimada/12, 2) * i for i in range(1, 13)]})
-    meses["Data Referencia"] = meses["Data Referencia"].dt.strftime(
-        "%Y-%m")
-
-    df_patrimonio = df_stats.reset_index()[["Valor"]].copy()
-    df_patrimonio["Data Referencia"] = pd.to_datetime(
-        df_stats.index).strftime("%Y-%m")
-    meses = meses.merge(df_patrimonio, how="left", on="Data Referencia")
-
-    # Calcular Atingimento Esperado após o merge
-    meses["Atingimento Esperado"] = meses["Meta Mensal"] / meta_estimada
+    resultado = simulate_goal_paths(
+        float(valor_inicio), float(aporte_mensal), aporte_desvio, taxas_mensais, choque_selic,
+        meses["Meta Mensal"].to_numpy(), float(patrimonio_final), caminhos)
+
+    faixas = pd.DataFrame(
+        resultado["percentis"].T,
+        index=meses.index,
+        columns=[f"P{percentil}" for percentil in PERCENTIS_MONTE_CARLO])
+    prob_meta = resultado["prob_meta_mensal"]
+    mes_meta = min(12, len(prob_meta)) - 1
+
+    create_info_metrics({
+        "Prob. Meta em 12 Meses": format_percentage(prob_meta[mes_meta]),
+        "Prob. Patrimônio Final": format_percentage(resultado["prob_patrimonio_final"]),
+        "Mediana ao Fim": faixas.iloc[-1]["P50"],
+    }, columns=3)
+
+    st.subheader("Faixas de Patrimônio Projetado")
+    st.line_chart(faixas.join(meses["Meta Mensal"]))
+
+    st.subheader("Probabilidade de Estar Acima da Meta Mensal (%)")
+    st.line_chart(pd.Series(prob_meta, index=meses.index, name="Probabilidade (%)"))
+
+
+def render_sensitivity_analysis(valor_inicio, patrimonio_final, horizonte):
+    """Mapa de calor de sensibilidade da meta (SELIC x aporte mensal)"""
+    st.markdown("### 🧪 Análise de Sensibilidade")
+    if patrimonio_final <= 0:
+        st.info("Informe o patrimônio estimado pós meta na aba 'Configuração' para ver a sensibilidade.")
+        return
+
+    col_selic, col_aporte = st.columns(2)
+    with col_selic:
+        faixa_selic = st.slider("Faixa da Selic (%)", 0.0, 30.0, (5.0, 15.0), step=0.25, key="sens_selic")
+    with col_aporte:
+        faixa_aporte = st.slider("Faixa de aporte mensal (R$)", 0, 50000, (0, 5000), step=100, key="sens_aporte")
+
+    col_valor, col_res, col_metrica = st.columns(3)
+    with col_valor:
+        valor_base = max(float(valor_inicio), 1.0)
+        fator_valor_inicio = st.select_slider(
+            "Valor inicial (x patrimônio atual)",
+            options=list(np.round(np.linspace(0.5, 1.5, RESOLUCAO_VALOR_INICIO_SENSIBILIDADE), 2)),
+            value=1.0,
+            key="sens_valor_inicio"
+        )
+    with col_res:
+        resolucao = st.select_slider("Resolução da grade", options=[25, 50, 100, 200], value=100, key="sens_resolucao")
+    with col_metrica:
+        metrica = st.selectbox(
+            "Métrica", ["Patrimônio Final", "Meses até a Meta", "Atingimento em 12 Meses (%)"], key="sens_metrica")
+
+    valor_exibido = valor_base * float(fator_valor_inicio)
+    eixos, resultados = compute_sensitivity_grid(
+        faixa_selic, faixa_aporte, valor_exibido, resolucao, float(patrimonio_final), horizonte)
+    grade = pd.DataFrame(
+        resultados[metrica],
+        index=pd.Index(np.round(eixos["selic"], 2), name="Selic (%)"),
+        columns=pd.Index(np.round(eixos["aporte"], 2), name="Aporte Mensal (R$)"))
+
+    st.caption(f"Valor inicial: {format_currency(valor_exibido)} · "
+               f"Meta: {format_currency(patrimonio_final)} · Horizonte: {horizonte} meses")
+    if PLOTLY_AVAILABLE:
+        fig = go.Figure(go.Heatmap(
+            z=grade.to_numpy(), x=grade.columns, y=grade.index,
+            colorscale="Viridis", colorbar={"title": metrica}))
+        fig.update_layout(xaxis_title="Aporte Mensal (R$)", yaxis_title="Selic (%)", height=500)
+        st.plotly_chart(fig, use_container_width=True)
+    else:
+        st.warning("Plotly indisponível: exibindo a grade em tabela.")
+        render_html_table(grade)
 
-    meses = meses[["Data Referencia", "Meta Mensal",
-                   "Atingimento Esperado", "Valor"]]
-    meses["Atingimento (%)"] = (
-        meses["Valor"] / meses["Meta Mensal"] * 100).round(1)
 
-    meses["Atingimento Ano"] = (
-        meses["Valor"] / patrimonio_final * 100).round(1)
+# =============================================================================
+# CARREGAMENTO E CACHE DE DADOS
+# =============================================================================
+# Toda a cadeia derivada do upload (leitura, conversões, pivot e estatísticas)
+# é cacheada pelo hash do conteúdo do arquivo, de modo que reruns causados por
+# outros widgets reaproveitam os DataFrames já calculados.
+
+def get_upload_hash(file_upload):
+    """Hash SHA-256 do conteúdo do upload, calculado uma vez por arquivo enviado"""
+    hashes = st.session_state.setdefault("upload_hashes", {})
+    if file_upload.file_id not in hashes:
+        hashes[file_upload.file_id] = hashlib.sha256(file_upload.getvalue()).hexdigest()
+    return hashes[file_upload.file_id]
+
+
+def detect_date_format(serie, tamanho_amostra=200):
+    """Detecta o formato da coluna Data a partir de uma amostra dos valores
+
+    Retorna "mixed" quando nenhum dos formatos conhecidos se aplica.
+    """
+    valores = serie.dropna()
+    if valores.empty:
+        return "mixed"
+
+    # Amostra espalhada pelo arquivo (início, meio e fim)
+    posicoes = np.unique(np.linspace(0, len(valores) - 1, min(tamanho_amostra, len(valores))).astype(int))
+    amostra = valores.iloc[posicoes].astype(str)
+
+    melhor_formato, melhor_taxa = "mixed", 0.0
+    for formato in FORMATOS_DATA:
+        taxa = pd.to_datetime(amostra, format=formato, errors="coerce").notna().mean()
+        if taxa > melhor_taxa:
+            melhor_formato, melhor_taxa = formato, taxa
+        if taxa == 1.0:
+            break
+    return melhor_formato
+
+
+def parse_data_column(serie, formato=None):
+    """Converte a coluna Data em uma única passada vetorizada
+
+    Retorna as datas (datetime64, sem hora) e a máscara das linhas que falharam.
+    """
+    formato = formato or detect_date_format(serie)
+    if formato == "mixed":
+        # Nenhum formato conhecido: interpretação elemento a elemento (dia primeiro)
+        datas = pd.to_datetime(serie, format="mixed", dayfirst=True, errors="coerce")
+    else:
+        datas = pd.to_datetime(serie, format=formato, errors="coerce")
+    return datas.dt.normalize(), datas.isna()
 
-    # Definir Data Referencia como índice
-    meses.set_index("Data Referencia", inplace=True)
 
-    # Container para a tabela de resultados
-    st.markdown("#### 📊 Acompanhamento de Metas")
+def split_invalid_rows(df, invalidas):
+    """Separa as linhas com data inválida (linha do CSV = índice + 2)"""
+    df_invalidas = df.loc[invalidas].copy()
+    df_invalidas.insert(0, "Linha", df_invalidas.index + 2)
+    return df_invalidas
+
+
+@st.cache_data(show_spinner="Processando arquivo...", max_entries=UPLOADS_CACHE_MAX)
+def load_dataset(dataset_hash, _conteudo, sep=",", decimal="."):
+    """Lê e normaliza o CSV enviado (cache por hash do conteúdo e opções de leitura)
+
+    Retorna o DataFrame normalizado e as linhas descartadas por data inválida.
+    """
+    df = pd.read_csv(io.BytesIO(_conteudo), sep=sep, decimal=decimal)
+    datas, invalidas = parse_data_column(df["Data"])
+    df_invalidas = split_invalid_rows(df, invalidas)
+
+    df = df.loc[~invalidas].copy()
+    df["Data"] = datas[~invalidas]
+    df["Valor"] = df["Valor"].astype(float)
+    return df.reset_index(drop=True), df_invalidas.reset_index(drop=True)
+
+
+@st.cache_data(show_spinner="Processando arquivo em blocos...", max_entries=UPLOADS_CACHE_MAX)
+def load_dataset_chunked(dataset_hash, _conteudo, sep=",", decimal=".", tamanho_bloco=TAMANHO_BLOCO_CSV):
+    """Lê o CSV em blocos, agregando cada bloco por Data e Instituição
+
+    O pico de memória fica limitado ao tamanho do bloco: apenas os saldos
+    somados (Valor) e a quantidade de registros (Registros) por par
+    (Data, Instituição) são mantidos entre blocos.
+    """
+    agregado = None
+    invalidas_blocos = []
+    formato = None
+    leitor = pd.read_csv(
+        io.BytesIO(_conteudo), sep=sep, decimal=decimal,
+        usecols=["Data", "Instituição", "Valor"], chunksize=tamanho_bloco)
+
+    # Os blocos mantêm a numeração contínua de linhas do arquivo
+    for bloco in leitor:
+        # Formato detectado no primeiro bloco e reutilizado nos demais
+        formato = formato or detect_date_format(bloco["Data"])
+        datas, invalidas = parse_data_column(bloco["Data"], formato)
+        if invalidas.any():
+            invalidas_blocos.append(split_invalid_rows(bloco, invalidas))
+
+        bloco = pd.DataFrame({
+            "Data": datas[~invalidas],
+            "Instituição": bloco.loc[~invalidas, "Instituição"],
+            "Valor": bloco.loc[~invalidas, "Valor"].astype(float),
+        })
+        # Instituição vazia é mantida, como na leitura linha a linha
+        parcial = bloco.groupby(["Data", "Instituição"], sort=False, dropna=False)["Valor"].agg(
+            Valor="sum", Registros="count")
+
+        # Dobra o bloco no agregado acumulado
+        if agregado is None:
+            agregado = parcial
+        else:
+            agregado = pd.concat([agregado, parcial]).groupby(level=[0, 1], sort=False, dropna=False).sum()
+
+    if agregado is None:
+        agregado = pd.DataFrame(
+            {"Valor": pd.Series(dtype=float), "Registros": pd.Series(dtype=int)},
+            index=pd.MultiIndex.from_arrays(
+                [pd.DatetimeIndex([]), pd.Index([], dtype=object)], names=["Data", "Instituição"]))
+
+    df = agregado.sort_index().reset_index()
+    df_invalidas = pd.concat(invalidas_blocos) if invalidas_blocos else pd.DataFrame(columns=["Linha", "Data", "Instituição", "Valor"])
+    return df, df_invalidas.reset_index(drop=True)
+
+
+@st.cache_data(show_spinner=False, max_entries=VISOES_CACHE_MAX)
+def build_institution_pivot(dataset_hash, _df):
+    """Pivot de saldos por Data x Instituição (cache por hash do dataset)"""
+    if "Registros" in _df.columns:
+        # Dataset agregado em blocos: saldo médio por par, como no pivot_table
+        _df = _df.assign(Valor=_df["Valor"] / _df["Registros"])
+    return _df.pivot_table(index="Data", columns="Instituição", values="Valor")
+
+
+@st.cache_data(show_spinner=False, max_entries=VISOES_CACHE_MAX)
+def build_general_stats(dataset_hash, _df, janelas=JANELAS_PADRAO, pasta=None):
+    """Estatísticas gerais do dataset (cache por hash do dataset, janelas e pasta do usuário)
+
+    Havendo estatísticas salvas na pasta do usuário, apenas as linhas afetadas
+    pelas datas novas ou alteradas em relação ao dataset salvo são recalculadas.
+    """
+    # Recortes filtrados não são comparados ao dataset salvo (seria relido a cada filtro)
+    info = None if dataset_hash.startswith(PREFIXO_HASH_FILTRO) else get_stored_dataset_info(pasta)
+    # Rótulos temporais ("6M"): estatísticas salvas com janelas por linhas são recalculadas
+    if info is not None and info.get("janelas") == [window_label(janela) for janela in janelas]:
+        df_stats_base = load_stored_stats(info["hash"], pasta)
+        # Estatísticas são indexadas por Data: valem tanto para o upload quanto para o dataset relido
+        if dataset_hash in (info["hash"], get_stored_view_hash(info["hash"])):
+            return df_stats_base
+        datas_alteradas = find_dataset_delta(info["hash"], dataset_hash, _df, pasta)
+        return update_general_stats(df_stats_base, _df, datas_alteradas, janelas)
+    return calc_general_stats(_df, janelas)
+
+
+@st.cache_data(show_spinner=False, max_entries=VISOES_CACHE_MAX)
+def build_selic_benchmark(dataset_hash, _df_stats, selic_gov):
+    """Patrimônio comparado a mantê-lo na SELIC (cache por dataset e versão da tabela SELIC)
+
+    O fator acumulado da SELIC é alinhado a cada data de registro; o
+    patrimônio da primeira data coberta é corrigido pela SELIC até as demais e
+    o excesso é medido em valor e, entre registros consecutivos, em rentabilidade.
+    """
+    dias, acumulado = build_selic_accrual(selic_gov)
+    datas = pd.to_datetime(_df_stats.index).to_numpy(dtype="datetime64[D]")
+    posicoes = np.searchsorted(dias, datas, side="right") - 1
+    cobertas = (posicoes >= 0) & (datas <= dias[-1])
+    fator = pd.Series(np.where(cobertas, acumulado[np.maximum(posicoes, 0)], np.nan), index=_df_stats.index)
+    valor = _df_stats["Valor"]
+
+    benchmark = pd.DataFrame({"Valor": valor}, index=_df_stats.index)
+    primeira = fator.first_valid_index()
+    if primeira is None:
+        return benchmark.assign(**{coluna: np.nan for coluna in COLUNAS_BENCHMARK_SELIC})
+
+    benchmark["Fator SELIC Acumulado"] = fator / fator[primeira]
+    benchmark["Patrimônio em SELIC"] = valor[primeira] * benchmark["Fator SELIC Acumulado"]
+    benchmark["Excesso sobre SELIC"] = valor - benchmark["Patrimônio em SELIC"]
+    rendimento_selic = fator / fator.shift(1)
+    benchmark["Rentabilidade SELIC no Período (%)"] = (rendimento_selic - 1) * 100
+    benchmark["Excesso Relativo no Período (%)"] = (valor / valor.shift(1) / rendimento_selic - 1) * 100
+    return benchmark
+
+
+# =============================================================================
+# PERSISTÊNCIA DO DATASET (VOLUME DE DADOS)
+# =============================================================================
+# O dataset normalizado é salvo em Arrow IPC (Feather) particionado por ano no
+# volume montado em data/, e relido com memory-map e projeção de colunas. Cada
+# usuário tem sua própria pasta, derivada de uma chave de acesso: na implantação
+# compartilhada, uma sessão nunca enxerga os dados salvos por outra.
+
+def get_owner_data_dir(chave):
+    """Pasta dos dados salvos do dono da chave (hash da chave, nunca a chave em si)"""
+    return str(DATA_DIR / "datasets" / hashlib.sha256(f"dashboard|{chave}".encode()).hexdigest())
+
+
+def get_stored_dataset_info(pasta):
+    """Metadados do dataset salvo na pasta do usuário, ou None se não houver"""
+    if not PYARROW_AVAILABLE or pasta is None:
+        return None
+    try:
+        with open(Path(pasta) / "dataset.json", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_dataset(df, dataset_hash, pasta):
+    """Salva o dataset normalizado particionado por ano e suas estatísticas na pasta do usuário"""
+    df_stats = build_general_stats(dataset_hash, df, pasta=pasta)
+    colunas = [col for col in COLUNAS_DATASET if col in df.columns]
+    tabela = pa.Table.from_pandas(df[colunas], preserve_index=False)
+    tabela = tabela.append_column("ano", pa.array(pd.to_datetime(df["Data"]).dt.year, pa.int32()))
+
+    # Escreve em diretório temporário e troca ao final, evitando leituras parciais
+    pasta = Path(pasta)
+    pasta.mkdir(parents=True, exist_ok=True)
+    destino = pasta / "dataset"
+    temporario = pasta / "dataset.tmp"
+    shutil.rmtree(temporario, ignore_errors=True)
+    pa_ds.write_dataset(
+        tabela, temporario, format="ipc",
+        partitioning=["ano"], partitioning_flavor="hive")
+    shutil.rmtree(destino, ignore_errors=True)
+    os.replace(temporario, destino)
+
+    # Estatísticas sem compressão para permitir leitura via memory-map
+    pa_feather.write_feather(df_stats.reset_index(), pasta / "stats.arrow", compression="uncompressed")
+
+    with open(pasta / "dataset.json", "w", encoding="utf-8") as f:
+        json.dump({
+            "hash": dataset_hash,
+            "registros": int(df["Registros"].sum()) if "Registros" in df.columns else len(df),
+            "colunas": colunas,
+            "janelas": [window_label(janela) for janela in JANELAS_PADRAO],
+            "salvo_em": datetime.datetime.now().strftime("%d/%m/%Y %H:%M"),
+        }, f)
+    load_stored_dataset.clear()
+    load_stored_stats.clear()
+
+
+def get_stored_view_hash(dataset_hash):
+    """Hash do dataset salvo relido: a ordem das linhas difere da do upload, então
+    os caches por posição de linha (ordenação, filtros) não podem ser compartilhados"""
+    return PREFIXO_HASH_SALVO + dataset_hash
+
+
+@st.cache_data(show_spinner="Carregando dados salvos...", max_entries=VISOES_CACHE_MAX)
+def load_stored_dataset(dataset_hash, pasta):
+    """Lê o dataset salvo (memory-map, apenas as colunas do dataset), ordenado por Data"""
+    info = get_stored_dataset_info(pasta)
+    dataset = pa_ds.dataset(
+        str(Path(pasta) / "dataset"), format="ipc", partitioning="hive",
+        filesystem=pa_fs.LocalFileSystem(use_mmap=True))
+    df = dataset.to_table(columns=info["colunas"]).to_pandas()
+    # Datasets salvos antes da troca para datetime64 guardam Data como date32
+    df["Data"] = pd.to_datetime(df["Data"]).astype("datetime64[ns]")
+    return df.sort_values("Data", kind="stable").reset_index(drop=True)
+
+
+@st.cache_data(show_spinner=False, max_entries=VISOES_CACHE_MAX)
+def load_stored_stats(dataset_hash, pasta):
+    """Lê as estatísticas salvas junto ao dataset"""
+    tabela = pa_feather.read_table(Path(pasta) / "stats.arrow", memory_map=True)
+    df_stats = tabela.to_pandas().set_index("Data")
+    df_stats.index = pd.to_datetime(df_stats.index).astype("datetime64[ns]")
+    return df_stats
+
+
+@st.cache_data(show_spinner=False, max_entries=VISOES_CACHE_MAX)
+def find_dataset_delta(base_hash, dataset_hash, _df, pasta):
+    """Datas cujo total difere do dataset salvo (novas, removidas ou alteradas)"""
+    totais_base = load_stored_dataset(base_hash, pasta).groupby("Data")["Valor"].sum()
+    totais_novo = _df.groupby("Data")["Valor"].sum()
+    totais_base, totais_novo = totais_base.align(totais_novo, join="outer")
+    return totais_base.index[totais_base.ne(totais_novo)].tolist()
+
+
+# =============================================================================
+# FILTROS GLOBAIS (PERÍODO E INSTITUIÇÕES)
+# =============================================================================
+# O dataset é indexado uma vez por hash: posições ordenadas por Data (recorte do
+# período por busca binária) e códigos categóricos de Instituição. As posições
+# valem só para a ordem de linhas do frame indexado; o dataset salvo relido
+# tem ordem própria e, por isso, hash próprio (get_stored_view_hash). Cada visão
+# filtrada recebe um hash próprio, então as seções abaixo reaproveitam seus
+# caches por visão e processam apenas as linhas selecionadas.
+
+@st.cache_data(show_spinner=False, max_entries=VISOES_CACHE_MAX)
+def build_filter_index(dataset_hash, _df):
+    """Índice do dataset para os filtros: ordem por Data, datas ordenadas e instituições categóricas"""
+    ordem = np.argsort(_df["Data"].to_numpy(), kind="stable")
+    instituicoes = pd.Categorical(_df["Instituição"].to_numpy()[ordem])
+    return {
+        "ordem": ordem,
+        "datas": _df["Data"].to_numpy()[ordem],
+        "codigos": instituicoes.codes,
+        "categorias": list(instituicoes.categories),
+    }
+
+
+@st.cache_data(show_spinner="Aplicando filtros...", max_entries=VISOES_CACHE_MAX)
+def filter_dataset(dataset_hash, _df, inicio, fim, instituicoes):
+    """Visão filtrada do dataset (cache por hash, período e instituições)
+
+    O período [inicio, fim] é recortado por busca binária nas datas ordenadas;
+    as instituições são comparadas pelos códigos categóricos. Retorna a visão
+    e o hash que a identifica nos caches das seções.
+    """
+    indice = build_filter_index(dataset_hash, _df)
+    limites = np.array([inicio, fim + timedelta(days=1)], dtype="datetime64[ns]")
+    primeira, ultima = indice["datas"].searchsorted(limites, side="left")
+    posicoes = indice["ordem"][primeira:ultima]
+
+    if len(instituicoes) < len(indice["categorias"]):
+        codigos = pd.Index(indice["categorias"]).get_indexer(instituicoes)
+        posicoes = posicoes[np.isin(indice["codigos"][primeira:ultima], codigos)]
+
+    filtro_hash = PREFIXO_HASH_FILTRO + hashlib.sha256(
+        f"{dataset_hash}|{inicio}|{fim}|{'|'.join(instituicoes)}".encode()).hexdigest()
+    return _df.iloc[np.sort(posicoes)].reset_index(drop=True), filtro_hash
+
+
+def render_global_filters(dataset_hash, df):
+    """Filtros globais de período e instituições aplicados a todas as seções
+
+    Sem restrição, devolve o próprio dataset e hash (mantendo o reaproveitamento
+    das estatísticas salvas).
+    """
+    indice = build_filter_index(dataset_hash, df)
+    data_min = pd.Timestamp(indice["datas"][0]).date()
+    data_max = pd.Timestamp(indice["datas"][-1]).date()
+
     with st.container(border=True):
-        # Configurando meses para exibição usando função centralizada
-        meses_display = meses.copy()
-
-        # Definir colunas de moeda e percentual
-        currency_cols = ["Meta Mensal", "Valor"]
-        percentage_cols = ["Atingimento (%)", "Atingimento Ano"]
-        
-        # Aplicar formatação usando função centralizada
-        meses_display = format_dataframe_for_display(
-            meses_display, 
-            currency_cols=currency_cols, 
-            percentage_cols=percentage_cols
-        )
+        st.markdown("#### 🔎 Filtros")
+        col_periodo, col_instituicoes = st.columns([2, 3])
+        with col_periodo:
+            periodo = st.date_input(
+                "Período",
+                value=(data_min, data_max),
+                min_value=data_min,
+                max_value=data_max,
+                format="DD/MM/YYYY",
+                key=f"filtro_periodo_{dataset_hash}"
+            )
+        with col_instituicoes:
+            instituicoes = st.multiselect(
+                "Instituições",
+                options=indice["categorias"],
+                default=indice["categorias"],
+                key=f"filtro_instituicoes_{dataset_hash}"
+            )
 
-        # Formatando Atingimento Esperado (valor decimal) - caso especial
-        meses_display["Atingimento Esperado"] = meses_display["Atingimento Esperado"].apply(
-            lambda x: f"{x:.3f}" if pd.notnull(x) else "-"
+    # Intervalo ainda incompleto (só a data inicial) vale até o fim; vazio, o período todo
+    if len(periodo) == 2:
+        inicio, fim = periodo
+    elif len(periodo) == 1:
+        inicio, fim = periodo[0], data_max
+    else:
+        inicio, fim = data_min, data_max
+    if not instituicoes:
+        instituicoes = indice["categorias"]
+    if (inicio, fim) == (data_min, data_max) and len(instituicoes) == len(indice["categorias"]):
+        return df, dataset_hash
+    return filter_dataset(dataset_hash, df, inicio, fim, tuple(sorted(instituicoes)))
+
+
+# =============================================================================
+# SEÇÕES DE ANÁLISE (FRAGMENTOS)
+# =============================================================================
+# Cada seção é um st.fragment: interações dentro dela reexecutam apenas a
+# própria seção. O conteúdo só é processado depois que o usuário habilita a
+# seção, então expanders fechados não custam pivots, estatísticas nem gráficos.
+
+def lazy_section_enabled(key):
+    """Toggle que habilita o processamento da seção sob demanda"""
+    return st.toggle("🔄 Carregar seção", key=key, help="Seções desabilitadas não processam dados")
+
+
+@st.fragment
+def render_data_section(dataset_hash, df, leitura_blocos):
+    """Seção de visualização dos dados carregados"""
+    with st.expander("📊 Visualizar Dados", expanded=False):
+        if not lazy_section_enabled("secao_dados"):
+            return
+
+        # Renderização da tabela
+        st.markdown("### 💾 Dados Carregados")
+        if leitura_blocos:
+            st.caption("Leitura em blocos: registros agregados por Data e Instituição.")
+        render_paginated_table(
+            df, dataset_hash, "tabela_dados",
+            column_config=build_column_config(currency_cols=["Valor"], date_cols=["Data"]))
+
+
+@st.fragment
+def render_institution_section(dataset_hash, df):
+    """Seção de análise por instituição"""
+    with st.expander("📊 Análise por Instituição", expanded=False):
+        if not lazy_section_enabled("secao_instituicao"):
+            return
+
+        df_instituicao = build_institution_pivot(dataset_hash, df)
+
+        tab_data, tab_history, tb_share = st.tabs(
+            ["📊 Dados por Instituição", "📜 Histórico de Evolução", "📈 Participação por Data"])
+
+        with tab_data:
+            st.markdown("### 🏦 Dados Organizados por Instituição")
+            # Formatação declarativa usando função centralizada
+            render_html_table(df_instituicao, column_config=build_column_config(
+                currency_cols=df_instituicao.columns.tolist(), date_cols=["_index"]))
+
+        with tab_history:
+            st.markdown("### 📈 Evolução Temporal por Instituição")
+            st.subheader("Evolução por Instituição")
+            if not df_instituicao.empty:
+                st.line_chart(df_instituicao)
+            else:
+                st.warning("Dados insuficientes para gráfico de evolução temporal.")
+
+        with tb_share:
+            st.markdown("### 📊 Participação por Data Selecionada")
+            if not df_instituicao.empty:
+                date = st.selectbox("📅 Selecione uma data",
+                                    options=sorted(df_instituicao.index),
+                                    format_func=lambda data: data.strftime("%d/%m/%Y"),
+                                    key="data_participacao")
+                st.subheader(f"Participação em {date:%d/%m/%Y}")
+                data_serie = df_instituicao.loc[date].dropna().rename("Valor")
+                if not data_serie.empty:
+                    st.bar_chart(data_serie)
+                else:
+                    st.warning(f"Dados indisponíveis para {date:%d/%m/%Y}.")
+            else:
+                st.warning("Dados insuficientes para análise por data.")
+
+
+@st.fragment
+def render_stats_section(dataset_hash, df, pasta_dados):
+    """Seção de estatísticas gerais"""
+    with st.expander("📊 Estatísticas Gerais", expanded=False):
+        if not lazy_section_enabled("secao_estatisticas"):
+            return
+
+        tipo_janela = st.radio(
+            "Janelas móveis",
+            ["Meses do calendário", "Dias corridos"],
+            horizontal=True,
+            help="Janelas temporais: valem para registros diários, mensais ou irregulares",
+            key="tipo_janela_estatisticas"
         )
+        janelas = JANELAS_PADRAO if tipo_janela == "Meses do calendário" else JANELAS_DIAS
+        df_stats = build_general_stats(dataset_hash, df, janelas, pasta_dados)
 
-        render_html_table(meses_display)
+        tab_stats, tab_abs, tab_rel, tab_selic = st.tabs(
+            ["📊 Dados", "📈 Histórico de Evolução", "📉 Crescimento Relativo", "🏁 Comparativo SELIC"])
 
-    # Retornar os valores solicitados incluindo o DataFrame meses
-    return data_inicio_meta, valor_inicio, meta_estimada, patrimonio_final, meses
+        with tab_stats:
+            # Formatação declarativa usando função centralizada
+            valor_cols = [col for col in df_stats.columns if 'Valor' in col or ('Diferença' in col and 'Rel' not in col)]
+            perc_cols = [col for col in df_stats.columns if 'Rel' in col]
+
+            columns_config = build_column_config(
+                currency_cols=valor_cols,
+                percentage_cols=perc_cols,
+                date_cols=["_index"]
+            )
+            render_paginated_table(
+                df_stats, f"{dataset_hash}_{'_'.join(map(window_label, janelas))}", "tabela_estatisticas",
+                column_config=columns_config)
+
+        with tab_abs:
+            abs_cols = ["Diferença Mensal Absoluta"] + [
+                f"Média {window_label(janela)} Diferença Mensal Absoluta" for janela in janelas]
+            st.subheader("Evolução Absoluta")
+            # Verificar colunas disponíveis
+            available_cols = [col for col in abs_cols if col in df_stats.columns]
+            if available_cols and not df_stats[available_cols].dropna().empty:
+                st.line_chart(df_stats[available_cols])
+            else:
+                st.warning("Dados insuficientes para gráfico de evolução absoluta.")
+
+        with tab_rel:
+            rel_cols = ["Diferença Mensal Rel"] + [
+                f"Evolução {window_label(janela)} Relativa" for janela in janelas]
+            st.subheader("Evolução Relativa (%)")
+            # Verificar colunas disponíveis
+            available_rel_cols = [
+                col for col in rel_cols if col in df_stats.columns]
+            if available_rel_cols and not df_stats[available_rel_cols].dropna().empty:
+                st.line_chart(df_stats[available_rel_cols])
+            else:
+                st.warning("Dados insuficientes para gráfico de evolução relativa.")
+
+        with tab_selic:
+            st.subheader("Patrimônio x SELIC")
+            try:
+                benchmark = build_selic_benchmark(dataset_hash, df_stats, get_selic())
+            except requests.RequestException:
+                st.warning("Dados SELIC indisponíveis no momento.")
+            else:
+                if benchmark["Patrimônio em SELIC"].notna().any():
+                    st.caption("Patrimônio da primeira data corrigido pela SELIC diária (dias úteis, base 252).")
+                    st.line_chart(benchmark[["Valor", "Patrimônio em SELIC"]])
+                    st.subheader("Excesso sobre SELIC")
+                    st.line_chart(benchmark[["Excesso sobre SELIC"]])
+                    render_html_table(benchmark, column_config=build_column_config(
+                        currency_cols=["Valor", "Patrimônio em SELIC", "Excesso sobre SELIC"],
+                        percentage_cols=["Rentabilidade SELIC no Período (%)", "Excesso Relativo no Período (%)"],
+                        decimal_cols=["Fator SELIC Acumulado"], date_cols=["_index"]))
+                else:
+                    st.warning("O histórico SELIC não cobre as datas do dataset.")
+
+
+@st.fragment
+def render_goals_section(dataset_hash, df, pasta_dados):
+    """Seção de metas financeiras"""
+    with st.expander("📊 Metas Financeiras", expanded=False):
+        if not lazy_section_enabled("secao_metas"):
+            return
+
+        df_stats = build_general_stats(dataset_hash, df, pasta=pasta_dados)
+
+        # Tabs para organizar seção de metas
+        tab_main, tab_data_meta, tab_graph, tab_sens, tab_mc = st.tabs(
+            ["📋 Configuração", "📊 Dados", "📈 Gráficos", "🧪 Sensibilidade", "🎲 Monte Carlo"])
+
+        with tab_main:
+            # Função principal de metas
+            (data_inicio_meta, valor_inicio, meta_estimada, patrimonio_final, meses,
+             aporte_mensal, taxas_mensais) = main_metas(df_stats, dataset_hash)
+
+        with tab_data_meta:
+            st.markdown("### 📊 Dados das Metas")
+            # Função centralizada para métricas
+            metas_metrics = {
+                "Data Início": data_inicio_meta.strftime("%d/%m/%Y"),
+                "Valor Inicial": valor_inicio,
+                "Meta Estimada": meta_estimada,
+                "Patrimônio Final": patrimonio_final
+            }
+
+            create_info_metrics(metas_metrics, columns=4)
+
+        with tab_graph:
+            st.markdown("### 📈 Gráficos das Metas")
+            # Gráficos relacionados às metas
+            if not meses.empty:
+                st.subheader("Patrimônio Projetado x Meta")
+                st.line_chart(meses[["Meta Mensal", "Patrimônio Projetado"]])
+
+                if "Atingimento Ano" in meses.columns:
+                    st.subheader("Atingimento de Meta Anual (%)")
+                    # Filtrar apenas valores não nulos para o gráfico
+                    meses_chart = meses[["Atingimento Ano"]].dropna()
+                    if not meses_chart.empty:
+                        st.line_chart(meses_chart)
+                    else:
+                        st.info("Dados insuficientes para gráfico de metas.")
+                else:
+                    st.warning("Dados de atingimento indisponíveis.")
+            else:
+                st.info("Configure metas na aba 'Configuração' para ver gráficos.")
+
+        with tab_sens:
+            render_sensitivity_analysis(valor_inicio, patrimonio_final, len(taxas_mensais))
+
+        with tab_mc:
+            render_monte_carlo_analysis(df_stats, valor_inicio, meta_estimada, patrimonio_final, meses,
+                                        aporte_mensal, taxas_mensais)
+
+
+@st.fragment
+def render_dataset_info_section(df, leitura_blocos):
+    """Seção de informações do dataset"""
+    with st.expander("ℹ️ Informações do Dataset", expanded=False):
+        if not lazy_section_enabled("secao_info_dataset"):
+            return
+
+        st.markdown("### 📊 Resumo dos Dados Carregados")
+
+        # Métricas principais usando função centralizada
+        dataset_metrics = {
+            "📝 Total de Registros": int(df["Registros"].sum()) if leitura_blocos else len(df),
+            "📅 Períodos Analisados": len(df['Data'].unique()),
+            "🏦 Instituições": len(df['Instituição'].unique())
+        }
+
+        create_info_metrics(dataset_metrics, columns=3)
+
+        # Informações detalhadas
+        col_period, col_inst = st.columns(2)
+
+        # Período analisado
+        with col_period:
+            st.info(f"📈 **Período:** {min(df['Data']).strftime('%d/%m/%Y')} até {max(df['Data']).strftime('%d/%m/%Y')}")
+
+        # Lista de instituições
+        with col_inst:
+            instituicoes_list = ', '.join(df['Instituição'].unique().tolist())
+            st.info(f"🏢 **Instituições:** {instituicoes_list}")
 
 
 # =============================================================================
@@ -588,6 +2027,9 @@ st.set_page_config(
     initial_sidebar_state="collapsed"
 )
 
+# Aquece a tabela SELIC em segundo plano já na primeira execução do servidor
+get_selic_store()
+
 # =============================================================================
 # CABEÇALHO E INTERFACE PRINCIPAL
 # =============================================================================
@@ -638,10 +2080,19 @@ with st.expander("📅 Calendário Financeiro", expanded=False):
         st.info(f"📊 **Dias no mês:** {dias_no_mes} dias")
 
     with col3:
-        dias_uteis = len([d for d in range(1, dias_no_mes + 1)
-                         if datetime.date(data_calendario.year, data_calendario.month, d).weekday() < 5])
+        periodo_calendario = pd.period_range(data_calendario, periods=1, freq="M")
+        dias_uteis = int(count_business_days_per_period(periodo_calendario)[0])
         st.info(f"💼 **Dias úteis:** {dias_uteis} dias")
 
+    # Feriados nacionais do mês selecionado
+    feriados_mes = [
+        f"{data.strftime('%d/%m')} - {nome}"
+        for data, nome in get_brazilian_holidays(data_calendario.year).items()
+        if data.month == data_calendario.month
+    ]
+    if feriados_mes:
+        st.caption("🎉 **Feriados nacionais:** " + " · ".join(feriados_mes))
+
 # =============================================================================
 # UPLOAD E PROCESSAMENTO DE DADOS
 # =============================================================================
@@ -658,213 +2109,80 @@ file_upload = st.file_uploader(
     help="Carregue um arquivo CSV com suas informações financeiras"
 )
 
-# Processamento se arquivo foi carregado
-if file_upload:
+# Chave de acesso aos dados salvos (cada chave tem sua própria pasta no volume)
+chave_dados = st.text_input(
+    "🔑 Chave dos dados salvos",
+    type="password",
+    help="Os datasets são salvos e lidos apenas na pasta desta chave; sem chave, nada é salvo ou carregado"
+) if PYARROW_AVAILABLE else ""
+pasta_dados = get_owner_data_dir(chave_dados) if chave_dados else None
 
-    # Leitura do CSV
-    df = pd.read_csv(file_upload)
+# Processamento se arquivo foi carregado (ou dataset salvo disponível)
+df = None
+if file_upload:
 
-    # Tratamento de diferentes formatos de data
-    # Tentativa 1: DD/MM/YYYY
+    # Leitura e normalização do CSV (cacheadas pelo hash do conteúdo)
+    dataset_hash = get_upload_hash(file_upload)
+    leitura_blocos = st.toggle(
+        "⚡ Leitura em blocos (arquivos grandes)",
+        value=file_upload.size > LIMITE_LEITURA_BLOCOS_MB * 1024 * 1024,
+        help="Agrega o arquivo por Data e Instituição durante a leitura, limitando o uso de memória"
+    )
     try:
-        df["Data"] = pd.to_datetime(df["Data"], format="%d/%m/%Y").dt.date
-    except:
-        # Tentativa 2: YYYY-MM-DD
-        try:
-            df["Data"] = pd.to_datetime(df["Data"], format="%Y-%m-%d").dt.date
-        except:
-            # Tentativa 3: Detecção automática
-            try:
-                df["Data"] = pd.to_datetime(
-                    df["Data"], infer_datetime_format=True).dt.date
-            except Exception as e:
-                # Erro: para execução
-                st.error(f"Erro ao converter datas: {e}")
-                st.stop()
-
-    # Visualização dos dados brutos
-    exp1 = st.expander("📊 Visualizar Dados", expanded=False)
-
-    # Conversão e formatação
-    df["Valor"] = df["Valor"].astype(float)
-
-    # Formatação usando função centralizada
-    df_display = format_dataframe_for_display(df, currency_cols=["Valor"])
-
-    # Renderização da tabela
-    exp1.markdown("### 💾 Dados Carregados")
-    render_html_table(df_display, exp1)
-
-    # Análise por instituição
-
-    exp2 = st.expander("📊 Análise por Instituição", expanded=False)
-    df_instituicao = df.pivot_table(
-        index="Data", columns="Instituição", values="Valor")
-
-    tab_data, tab_history, tb_share = exp2.tabs(
-        ["📊 Dados por Instituição", "📜 Histórico de Evolução", "📈 Participação por Data"])
-
-    with tab_data:
-        st.markdown("### 🏦 Dados Organizados por Instituição")
-        # Formatação usando função centralizada
-        df_instituicao_display = format_dataframe_for_display(
-            df_instituicao, currency_cols=df_instituicao.columns.tolist()
-        )
-        render_html_table(df_instituicao_display)
-
-    with tab_history:
-        st.markdown("### 📈 Evolução Temporal por Instituição")
-        st.subheader("Evolução por Instituição")
-        if not df_instituicao.empty:
-            st.line_chart(df_instituicao)
+        if leitura_blocos:
+            df, df_invalidas = load_dataset_chunked(dataset_hash, file_upload.getvalue())
+            # O frame agregado difere do lido linha a linha: hash próprio para os
+            # caches por linha (ordenação, filtros) não misturarem as duas leituras
+            dataset_hash = hashlib.sha256(f"{dataset_hash}|blocos".encode()).hexdigest()
         else:
-            st.warning("Dados insuficientes para gráfico de evolução temporal.")
-
-    with tb_share:
-        st.markdown("### 📊 Participação por Data Selecionada")
-        if not df_instituicao.empty:
-            date = st.selectbox("📅 Selecione uma data",
-                                options=sorted(df_instituicao.index),
-                                key="data_participacao")
-            st.subheader(f"Participação em {date}")
-            data_serie = df_instituicao.loc[date].dropna()
-            if not data_serie.empty:
-                st.bar_chart(data_serie)
-            else:
-                st.warning(f"Dados indisponíveis para {date}.")
-        else:
-            st.warning("Dados insuficientes para análise por data.")
-
-    exp3 = st.expander("📊 Estatísticas Gerais", expanded=False)
-
-    df_stats = calc_general_stats(df)
-
-    columns_config = {
-        "Valor": st.column_config.NumberColumn("Valor", format="R$ %.2f"),
-        "Diferença Mensal Absoluta": st.column_config.NumberColumn("Diferença Mensal Absoluta", format="R$ %.2f"),
-        "Média 6M Diferença Mensal Absoluta": st.column_config.NumberColumn("Média 6M Diferença Mensal Absoluta", format="R$ %.2f"),
-        "Média 12M Diferença Mensal Absoluta": st.column_config.NumberColumn("Média 12M Diferença Mensal Absoluta", format="R$ %.2f"),
-        "Média 24M Diferença Mensal Absoluta": st.column_config.NumberColumn("Média 24M Diferença Mensal Absoluta", format="R$ %.2f"),
-        "Evolução 6M Diferença Mensal": st.column_config.NumberColumn("Evolução 6M Diferença Mensal", format="R$ %.2f"),
-        "Evolução 12M Diferença Mensal": st.column_config.NumberColumn("Evolução 12M Diferença Mensal", format="R$ %.2f"),
-        "Evolução 24M Diferença Mensal": st.column_config.NumberColumn("Evolução 24M Diferença Mensal", format="R$ %.2f"),
-        "Diferença Mensal Rel": st.column_config.NumberColumn("Diferença Mensal Rel", format="%.2%"),
-        "Evolução 6M Relativa": st.column_config.NumberColumn("Evolução 6M Relativa", format="%.2%"),
-        "Evolução 12M Relativa": st.column_config.NumberColumn("Evolução 12M Relativa", format="%.2%"),
-        "Evolução 24M Relativa": st.column_config.NumberColumn("Evolução 24M Relativa", format="%.2%"),
-    }
-
-    tab_stats, tab_abs, tab_rel = exp3.tabs(
-        ["📊 Dados", "📈 Histórico de Evolução", "📉 Crescimento Relativo"])
-
-    with tab_stats:
-        # Formatação usando função centralizada
-        valor_cols = [col for col in df_stats.columns if 'Valor' in col or ('Diferença' in col and 'Rel' not in col)]
-        perc_cols = [col for col in df_stats.columns if 'Rel' in col]
-        
-        df_stats_display = format_dataframe_for_display(
-            df_stats, 
-            currency_cols=valor_cols,
-            percentage_cols=perc_cols
-        )
-        render_html_table(df_stats_display)
-
-    with tab_abs:
-        abs_cols = [
-            "Diferença Mensal Absoluta",
-            "Média 6M Diferença Mensal Absoluta",
-            "Média 12M Diferença Mensal Absoluta",
-            "Média 24M Diferença Mensal Absoluta",
-        ]
-        st.subheader("Evolução Absoluta")
-        # Verificar colunas disponíveis
-        available_cols = [col for col in abs_cols if col in df_stats.columns]
-        if available_cols and not df_stats[available_cols].dropna().empty:
-            st.line_chart(df_stats[available_cols])
-        else:
-            st.warning("Dados insuficientes para gráfico de evolução absoluta.")
-
-    with tab_rel:
-        rel_cols = [
-            "Diferença Mensal Rel",
-            "Evolução 6M Relativa",
-            "Evolução 12M Relativa",
-            "Evolução 24M Relativa",
-        ]
-        st.subheader("Evolução Relativa (%)")
-        # Verificar colunas disponíveis
-        available_rel_cols = [
-            col for col in rel_cols if col in df_stats.columns]
-        if available_rel_cols and not df_stats[available_rel_cols].dropna().empty:
-            st.line_chart(df_stats[available_rel_cols])
-        else:
-            st.warning("Dados insuficientes para gráfico de evolução relativa.")
-
-    with st.expander("📊 Metas Financeiras", expanded=False):
-        # Tabs para organizar seção de metas
-        tab_main, tab_data_meta, tab_graph = st.tabs(
-            ["📋 Configuração", "📊 Dados", "📈 Gráficos"])
-
-        with tab_main:
-            # Função principal de metas
-            data_inicio_meta, valor_inicio, meta_estimada, patrimonio_final, meses = main_metas(
-                df_stats)
-
-        with tab_data_meta:
-            st.markdown("### 📊 Dados das Metas")
-            # Função centralizada para métricas
-            if 'data_inicio_meta' in locals():
-                metas_metrics = {
-                    "Data Início": data_inicio_meta.strftime("%d/%m/%Y"),
-                    "Valor Inicial": valor_inicio,
-                    "Meta Estimada": meta_estimada,
-                    "Patrimônio Final": patrimonio_final
-                }
-                
-                create_info_metrics(metas_metrics, columns=4)
-
-        with tab_graph:
-            st.markdown("### 📈 Gráficos das Metas")
-            # Gráficos relacionados às metas
-            if 'meses' in locals() and not meses.empty:
-                if "Atingimento Ano" in meses.columns:
-                    st.subheader("Atingimento de Meta Anual (%)")
-                    # Filtrar apenas valores não nulos para o gráfico
-                    meses_chart = meses[["Atingimento Ano"]].dropna()
-                    if not meses_chart.empty:
-                        st.line_chart(meses_chart)
-                    else:
-                        st.info("Dados insuficientes para gráfico de metas.")
-                else:
-                    st.warning("Dados de atingimento indisponíveis.")
-            else:
-                st.info("Configure metas na aba 'Configuração' para ver gráficos.")
-
-    # Informações do dataset
-
-    with st.expander("ℹ️ Informações do Dataset"):
-        st.markdown("### 📊 Resumo dos Dados Carregados")
-
-        # Métricas principais usando função centralizada
-        dataset_metrics = {
-            "📝 Total de Registros": len(df),
-            "📅 Períodos Analisados": len(df['Data'].unique()),
-            "🏦 Instituições": len(df['Instituição'].unique())
-        }
-        
-        create_info_metrics(dataset_metrics, columns=3)
-
-        # Informações detalhadas
-        col_period, col_inst = st.columns(2)
-
-        # Período analisado
-        with col_period:
-            st.info(f"📈 **Período:** {min(df['Data']).strftime('%d/%m/%Y')} até {max(df['Data']).strftime('%d/%m/%Y')}")
-
-        # Lista de instituições
-        with col_inst:
-            instituicoes_list = ', '.join(df['Instituição'].unique().tolist())
-            st.info(f"🏢 **Instituições:** {instituicoes_list}")
+            df, df_invalidas = load_dataset(dataset_hash, file_upload.getvalue())
+    except Exception as e:
+        # Erro: para execução
+        st.error(f"Erro ao processar arquivo: {e}")
+        st.stop()
+
+    # Relatório de datas que não puderam ser convertidas
+    if df.empty:
+        st.error("Nenhuma data válida encontrada na coluna Data.")
+        st.stop()
+    if not df_invalidas.empty:
+        st.warning(f"⚠️ {len(df_invalidas)} linha(s) com data inválida foram ignoradas.")
+        with st.expander("🔎 Linhas ignoradas", expanded=False):
+            render_html_table(df_invalidas)
+
+    # Delta em relação ao dataset salvo (atualização incremental das estatísticas)
+    dataset_salvo = get_stored_dataset_info(pasta_dados)
+    if dataset_salvo is not None and dataset_salvo["hash"] != dataset_hash:
+        datas_alteradas = find_dataset_delta(dataset_salvo["hash"], dataset_hash, df, pasta_dados)
+        if datas_alteradas:
+            st.info(f"🔄 {len(datas_alteradas)} data(s) nova(s) ou alterada(s) em relação ao dataset salvo "
+                    f"(a partir de {min(datas_alteradas).strftime('%d/%m/%Y')}).")
+
+    # Persistência opcional no volume de dados
+    if pasta_dados is not None and st.button("💾 Salvar dataset no volume de dados", help="Próximas sessões com a mesma chave abrem sem precisar do CSV"):
+        try:
+            save_dataset(df, dataset_hash, pasta_dados)
+            st.success("Dataset salvo com sucesso!")
+        except OSError as e:
+            st.error(f"Erro ao salvar dataset: {e}")
+
+elif (dataset_salvo := get_stored_dataset_info(pasta_dados)) is not None:
+    if st.toggle("📦 Usar dados salvos", value=True, help="Dataset salvo para a chave informada"):
+        df = load_stored_dataset(dataset_salvo["hash"], pasta_dados)
+        dataset_hash = get_stored_view_hash(dataset_salvo["hash"])
+        leitura_blocos = "Registros" in df.columns
+        st.info(f"📦 Dados salvos em {dataset_salvo['salvo_em']} ({dataset_salvo['registros']} registros)")
+
+if df is not None:
+    df, dataset_hash = render_global_filters(dataset_hash, df)
+    if df.empty:
+        st.warning("Nenhum registro no período e instituições selecionados.")
+    else:
+        render_data_section(dataset_hash, df, leitura_blocos)
+        render_institution_section(dataset_hash, df)
+        render_stats_section(dataset_hash, df, pasta_dados)
+        render_goals_section(dataset_hash, df, pasta_dados)
+        render_dataset_info_section(df, leitura_blocos)
 
 # =============================================================================
 # RODAPÉ
@@ -136,6 +136,22 @@ def get_calendar_css():
         100% { box-shadow: 0 10px 25px -5px rgba(245, 158, 11, 0.4); }
     }
     
+    .calendar-day.weekend {
+        color: #FF6B6B;
+        background: #FFF5F5;
+        border-color: #FFE5E5;
+    }
+    
+    .calendar-day.holiday {
+        color: #7c3aed;
+        background: #f5f3ff;
+        border-color: #ddd6fe;
+    }
+    
+    .calendar-day.empty {
+        visibility: hidden;
+    }
+    
     .calendar-day.other-month {
         color: #9ca3af;
         background: #f9fafb;